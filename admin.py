@@ -0,0 +1,571 @@
+"""
+Command-line admin tools for the Grand Prix data files, for cron jobs and
+headless servers. Tk is never imported, and modules that only one command
+needs (csv, json, the password worker pool) are imported inside it, so a
+report starts in a few tens of milliseconds.
+
+Reports, exports and checks read a snapshot of the data files and are safe
+to run while the app is open. import and compact rewrite data files, so run
+them while it is closed (the app would overwrite the users file on its next
+save).
+
+Run from the data directory (or pass --data DIR):
+    python admin.py report sales [--json]
+    python admin.py report occupancy [--json]
+    python admin.py export {users,tickets,discounts,waitlist} [--format csv|json] [-o FILE]
+    python admin.py import users FILE.csv [--dry-run]
+    python admin.py check
+    python admin.py compact [--max-age HOURS]
+    python admin.py archive [--after-days N] [--event ID ...] [--dry-run]
+"""
+import argparse
+import itertools
+import os
+import re
+import sys
+import time
+
+import main
+
+EMAIL_PATTERN = re.compile(r"[^@]+@[^@]+\.[^@]+")  # same rule as the registration form
+
+
+def open_snapshot():
+    """Return a Snapshot of the data files in the current directory."""
+    return main.PersistenceQueue().snapshot()
+
+
+def open_archive(events):
+    """Return the TicketArchive in the current directory with its index loaded."""
+    return main.TicketArchive(events).load()
+
+
+def print_json(data, out=sys.stdout):
+    import json
+    json.dump(data, out, indent=2, default=str)
+    out.write("\n")
+
+
+# -------------------- REPORTS --------------------#
+def report_sales(args):
+    events = main.default_events()
+    rows = {event.eventID: {"eventID": event.eventID, "event": event.name, "date": event.date,
+                            "tickets": 0, "value": 0.0, "by_type": {}} for event in events}
+    with open_snapshot() as snapshot:
+        for ticket in snapshot.read(main.TICKETS_FILE, main.TicketCodec(events)):
+            if not main.is_sold(ticket):
+                continue  # the same rule as occupancy and the admin dashboard
+            row = rows.get(ticket.event.eventID)
+            if row is None:  # an event that is no longer in the catalogue
+                row = rows[ticket.event.eventID] = {"eventID": ticket.event.eventID, "event": ticket.event.name,
+                                                    "date": None, "tickets": 0, "value": 0.0, "by_type": {}}
+            row["tickets"] += 1
+            row["value"] += main.face_value(ticket)
+            kind = type(ticket).__name__
+            row["by_type"][kind] = row["by_type"].get(kind, 0) + 1
+    # Archived events come straight from the archive index
+    for entry in open_archive(events).entries():
+        row = rows.setdefault(entry.eventID, {"eventID": entry.eventID, "event": entry.name, "date": entry.date,
+                                              "tickets": 0, "value": 0.0, "by_type": {}})
+        row["tickets"] += entry.tickets
+        row["value"] += entry.value
+        row["by_type"]["archived"] = row["by_type"].get("archived", 0) + entry.tickets
+
+    if args.json:
+        print_json(list(rows.values()))
+        return 0
+    print(f"{'Event':24} {'Date':10} {'Tickets':>8} {'Face value':>12}  By type")
+    for row in rows.values():
+        types = ", ".join(f"{kind} {n}" for kind, n in sorted(row["by_type"].items()))
+        print(f"{row['event'][:24]:24} {str(row['date'] or ''):10} {row['tickets']:>8,} "
+              f"{row['value']:>12,.2f}  {types}")
+    print(f"{'Total':35} {sum(r['tickets'] for r in rows.values()):>8,} "
+          f"{sum(r['value'] for r in rows.values()):>12,.2f}")
+    return 0
+
+
+def report_occupancy(args):
+    events = main.default_events()
+    archive = open_archive(events)
+    with open_snapshot() as snapshot:
+        _, sold = main.sales_report(snapshot, archive)
+        waiting = {}
+        for entry in snapshot.read(main.WAITLIST_FILE, main.WaitlistCodec()):
+            waiting[entry.eventID] = waiting.get(entry.eventID, 0) + 1
+
+    rows = []
+    for event in events:
+        seats = event.venue.rows * event.venue.seats_per_row
+        taken = sold.get(event.eventID, 0)
+        rows.append({"eventID": event.eventID, "event": event.name, "date": event.date, "seats": seats,
+                     "sold": taken, "available": 0 if archive.is_archived(event.eventID) else seats - taken,
+                     "waiting": waiting.get(event.eventID, 0), "archived": archive.is_archived(event.eventID)})
+    if args.json:
+        print_json(rows)
+        return 0
+    print(f"{'Event':24} {'Date':10} {'Seats':>6} {'Sold':>6} {'Free':>6} {'Full':>6} {'Waiting':>8}")
+    for row in rows:
+        print(f"{row['event'][:24]:24} {str(row['date']):10} {row['seats']:>6,} {row['sold']:>6,} "
+              f"{row['available']:>6,} {row['sold'] / row['seats']:>6.0%} {row['waiting']:>8,}"
+              + ("  finished (archived)" if row["archived"] else ""))
+    return 0
+
+
+# -------------------- IMPORT / EXPORT --------------------#
+EXPORTS = {
+    "users": (main.USERS_FILE, main.UserCodec,
+              ("userID", "name", "email", "admin"),
+              lambda u: (u.userID, u.name, u.email, isinstance(u, main.Admin))),
+    "tickets": (main.TICKETS_FILE, main.TicketCodec,
+                ("ticketID", "type", "eventID", "event", "seat", "ownerID", "price", "issued"),
+                lambda t: (t.ticketID, type(t).__name__, t.event.eventID, t.event.name,
+                           t.seat.seatID if t.seat else "", t.ownerID or "", t.price,
+                           t.issueDate.isoformat(sep=" "))),
+    "discounts": (main.DISCOUNTS_FILE, main.DiscountCodec,
+                  ("discountID", "code", "description", "percentage", "valid_from", "valid_until",
+                   "max_uses", "per_user_limit", "uses"),
+                  lambda d: (d.discountID, d.code or "", d.description, d.percentage, d.valid_from or "",
+                             d.valid_until or "", d.max_uses or "", d.per_user_limit or "", d.uses)),
+    "waitlist": (main.WAITLIST_FILE, main.WaitlistCodec,
+                 ("eventID", "userID", "ticket_type", "priority", "joined"),
+                 lambda e: (e.eventID, e.userID, e.ticket_type.__name__, e.priority,
+                            (main.TIMESTAMP_EPOCH + e.joined_us * main.ONE_MICROSECOND).isoformat(sep=" "))),
+}
+
+
+def export(args):
+    path, codec, columns, row = EXPORTS[args.kind]
+    events = main.default_events()
+    codec = codec(events) if codec is main.TicketCodec else codec()
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        with open_snapshot() as snapshot:
+            records = snapshot.read(path, codec)
+            if args.archived and args.kind == "tickets":
+                archive = open_archive(events)
+                records = itertools.chain(records, *(archive.tickets(entry.eventID) for entry in archive.entries()))
+            if args.format == "json":
+                print_json([dict(zip(columns, row(record))) for record in records], out)
+                return 0
+            import csv
+            writer = csv.writer(out)
+            writer.writerow(columns)
+            writer.writerows(row(record) for record in records)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+def import_users(args):
+    """
+    Add users from a CSV file with name, email and password columns (and an
+    optional admin column of yes/no). Passwords may be given in clear or as
+    hashes in the stored format. Rows with a bad or already registered email
+    are skipped and reported.
+    """
+    import csv
+    try:
+        users = list(main.read_records(main.USERS_FILE, main.UserCodec()))
+    except FileNotFoundError:
+        users = []
+    emails = {user.email for user in users}
+    accepted, skipped = [], []
+    with open(args.file, newline="", encoding="utf-8") as f:
+        for line, row in enumerate(csv.DictReader(f), 2):
+            email = (row.get("email") or "").strip()
+            name, password = (row.get("name") or "").strip(), row.get("password") or ""
+            if not EMAIL_PATTERN.fullmatch(email):
+                skipped.append(f"line {line}: invalid email {email!r}")
+            elif email in emails:
+                skipped.append(f"line {line}: {email} is already registered")
+            elif not name or not password:
+                skipped.append(f"line {line}: name and password are required")
+            else:
+                emails.add(email)
+                admin = (row.get("admin") or "").strip().lower() in ("1", "yes", "true", "y")
+                accepted.append((name, email, password, admin))
+
+    # Hash the clear-text passwords on every core; this is most of the run time
+    credentials = main.CredentialService()
+    try:
+        hashes = [password if main.parse_password_hash(password) else credentials.hash(password)
+                  for _, _, password, _ in accepted]
+        hashes = [h if isinstance(h, str) else h.result() for h in hashes]
+    finally:
+        credentials.shutdown()
+
+    next_id = max((user.userID for user in users), default=0) + 1
+    for (name, email, _, admin), password_hash in zip(accepted, hashes):
+        users.append((main.Admin if admin else main.User)(next_id, name, email, password_hash))
+        next_id += 1
+    for reason in skipped:
+        print(f"⚠️ Skipped {reason}")
+    if args.dry_run:
+        print(f"Would import {len(accepted)} users ({len(skipped)} skipped).")
+        return 0
+    if accepted:
+        main.atomic_write(main.USERS_FILE, main.encode_records(main.UserCodec(), users))
+    print(f"✅ Imported {len(accepted)} users ({len(skipped)} skipped).")
+    return 0
+
+
+# -------------------- MAINTENANCE --------------------#
+def read_all(snapshot, path, codec, problems):
+    """Return every record of one snapshot file, or [] (with a problem noted) if it cannot be read."""
+    try:
+        return list(snapshot.read(path, codec))
+    except (main.RecordFormatError, UnicodeDecodeError, ValueError) as e:
+        problems.append(f"{path} cannot be read: {e}")
+        return []
+
+
+def ticket_repairs(tickets, archive, problems):
+    """
+    Return what compact does to the live tickets, as (action, ticket, message)
+    with action "drop", "renumber" or "archive"; check reports the messages.
+    Tickets that are not sold (main.is_sold) are dropped. A seat sold more than
+    once keeps its first ticket. Tickets whose ID is taken by an earlier ticket
+    or an archived one get a new ID, and tickets of archived events are moved
+    to the archive.
+    """
+    # Archived tickets keep their IDs; a live ticket with one of them is a different ticket
+    colliding = {}  # id(live ticket) -> the archived ticket with its ID
+    live = {}
+    for ticket in tickets:
+        live.setdefault(ticket.ticketID, []).append(ticket)
+    for entry in archive.entries():
+        suspects = [ticketID for ticketID in live if entry.first_id <= ticketID <= entry.last_id]
+        if not suspects:
+            continue
+        try:
+            archived = {ticket.ticketID: ticket for ticket in archive.tickets(entry.eventID)}
+        except (OSError, main.RecordFormatError) as e:
+            problems.append(f"the archive segment of {entry.name} cannot be read: {e}")
+            continue
+        for ticketID in suspects:
+            old = archived.get(ticketID)
+            for ticket in live[ticketID] if old is not None else ():
+                if (old.event.eventID, old.seat.seatID if old.seat else None) != (
+                        ticket.event.eventID, ticket.seat.seatID if ticket.seat else None):
+                    colliding[id(ticket)] = old
+
+    repairs = []
+    seen_ids, seats = set(), {}
+    for ticket in sorted(tickets, key=lambda ticket: ticket.ticketID):  # the first sale of a seat is kept
+        if ticket.seat is None:
+            repairs.append(("drop", ticket, f"ticket {ticket.ticketID} has no seat"))
+            continue
+        if ticket.ownerID is None:
+            # Loading only reserves seats of owned tickets, so this seat could be sold again
+            repairs.append(("drop", ticket, f"ticket {ticket.ticketID} has no owner, so seat "
+                                            f"{ticket.seat.seatID} at {ticket.event.name} is not reserved"))
+            continue
+        first = seats.setdefault((ticket.event.eventID, ticket.seat.seatID), ticket)
+        if first is not ticket:
+            repairs.append(("drop", ticket, f"seat {ticket.seat.seatID} at {ticket.event.name} is sold to "
+                                            f"ticket {first.ticketID} and again to ticket {ticket.ticketID} "
+                                            f"of user {ticket.ownerID}, who needs a refund"))
+            continue
+        if ticket.ticketID in seen_ids:
+            repairs.append(("renumber", ticket, f"ticket ID {ticket.ticketID} is used by more than one ticket"))
+        elif id(ticket) in colliding:
+            old = colliding[id(ticket)]
+            repairs.append(("renumber", ticket, f"ticket ID {ticket.ticketID} in {main.TICKETS_FILE} also belongs "
+                                                f"to an archived ticket for {old.event.name}, "
+                                                f"seat {old.seat.seatID if old.seat else 'none'}"))
+        seen_ids.add(ticket.ticketID)
+        if archive.is_archived(ticket.event.eventID):
+            repairs.append(("archive", ticket, f"ticket {ticket.ticketID} is for archived event "
+                                               f"{ticket.event.name} but still in {main.TICKETS_FILE}"))
+    return repairs
+
+
+def check(args):
+    """Report data that the app would load wrongly; exits with status 1 if there is any."""
+    events = main.default_events()
+    catalogue = {event.eventID: event for event in events}
+    problems, notes = [], []
+    with open_snapshot() as snapshot:
+        for path in main.DATA_FILES:
+            if path not in snapshot.files:
+                notes.append(f"{path} does not exist yet")
+        users = read_all(snapshot, main.USERS_FILE, main.UserCodec(), problems)
+        tickets = read_all(snapshot, main.TICKETS_FILE, main.TicketCodec(events), problems)
+        discounts = read_all(snapshot, main.DISCOUNTS_FILE, main.DiscountCodec(), problems)
+        waiting = read_all(snapshot, main.WAITLIST_FILE, main.WaitlistCodec(), problems)
+
+    def duplicates(values):
+        seen, repeated = set(), set()
+        for value in values:
+            (repeated if value in seen else seen).add(value)
+        return sorted(repeated, key=str)
+
+    user_ids = {user.userID for user in users}
+    for userID in duplicates(user.userID for user in users):
+        problems.append(f"user ID {userID} is used by more than one account (fix by hand)")
+    for email in duplicates(user.email for user in users):
+        problems.append(f"email {email} is registered more than once (fix by hand)")
+    plaintext = sum(1 for user in users if main.parse_password_hash(user.password) is None)
+    if plaintext:
+        notes.append(f"{plaintext} passwords are stored in clear (compact hashes them; "
+                     f"the app hashes each at its next login)")
+
+    repairs = ticket_repairs(tickets, open_archive(events), problems)
+    problems.extend(f"{message} (compact repairs this)" for _, _, message in repairs)
+    for ticket in tickets:
+        venue = ticket.event.venue
+        if venue is not None and ticket.seat is not None and venue.get_seat(ticket.seat.seatID) is not ticket.seat:
+            problems.append(f"ticket {ticket.ticketID} is for seat {ticket.seat.seatID}, which the venue of "
+                            f"{ticket.event.name} does not have (fix by hand)")
+    unknown = sum(1 for ticket in tickets if ticket.event.eventID not in catalogue)
+    if unknown:
+        notes.append(f"{unknown} tickets are for events no longer in the catalogue (reports list them apart)")
+    deleted_owners = sum(1 for ticket in tickets if ticket.ownerID is not None and ticket.ownerID not in user_ids)
+    if deleted_owners:
+        notes.append(f"{deleted_owners} tickets belong to deleted accounts (their seats stay sold)")
+
+    for discountID in duplicates(discount.discountID for discount in discounts):
+        problems.append(f"discount ID {discountID} is used more than once (compact renumbers the later ones)")
+    for code in duplicates(discount.code for discount in discounts if discount.code):
+        problems.append(f"promo code {code} belongs to more than one discount (fix by hand)")
+    for discount in discounts:
+        if discount.max_uses is not None and discount.uses > discount.max_uses:
+            problems.append(f"discount {discount.discountID} was used {discount.uses} times, "
+                            f"over its limit of {discount.max_uses} (fix by hand)")
+        if sum(discount.redemptions.values()) > discount.uses:
+            problems.append(f"discount {discount.discountID} has more redemptions than uses "
+                            f"(compact counts the redemptions as uses)")
+
+    for eventID, userID in duplicates((entry.eventID, entry.userID) for entry in waiting):
+        problems.append(f"user {userID} is on the waitlist for event {eventID} more than once "
+                        f"(compact keeps the first entry)")
+    stale = sum(1 for entry in waiting if entry.userID not in user_ids or entry.eventID not in catalogue)
+    if stale:
+        notes.append(f"{stale} waitlist entries are for deleted accounts or unknown events (compact drops them)")
+
+    print(f"Checked {len(users):,} users, {len(tickets):,} tickets, {len(discounts):,} discounts "
+          f"and {len(waiting):,} waitlist entries.")
+    for note in notes:
+        print(f"ℹ️ {note}")
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print("✅ No problems found.")
+    return 1 if problems else 0
+
+
+def repair_tickets(tickets, codec, archive, to_archive):
+    """
+    Apply ticket_repairs to the tickets read with codec and return those to
+    keep. New IDs continue from the codec's high-water mark, which is raised
+    past them. Events whose tickets must move to the archive are added to
+    to_archive.
+    """
+    problems = []
+    repairs = ticket_repairs(tickets, archive, problems)
+    for problem in problems:
+        print(f"  ❌ {problem}")
+    next_id = max([codec.next_id, max((ticket.ticketID for ticket in tickets), default=0) + 1]
+                  + [entry.last_id + 1 for entry in archive.entries()])
+    dropped = set()
+    for action, ticket, message in repairs:
+        if action == "drop":
+            dropped.add(id(ticket))
+            print(f"  dropped: {message}")
+        elif action == "renumber":
+            ticket.ticketID, next_id = next_id, next_id + 1
+            print(f"  {message}: it is now ticket {ticket.ticketID} (its entry code changes)")
+        else:
+            to_archive.add(ticket.event.eventID)
+    codec.next_id = next_id
+    return [ticket for ticket in tickets if id(ticket) not in dropped]
+
+
+def hash_passwords(users):
+    """Hash the passwords older versions stored in clear, on every core."""
+    credentials = main.CredentialService()
+    try:
+        hashed = credentials.migrate(users)
+    finally:
+        credentials.shutdown()
+    if hashed:
+        print(f"  hashed {hashed:,} passwords stored in clear")
+
+
+def repair_discounts(discounts):
+    """Give later discounts with a duplicate ID a new one, and count every redemption as a use."""
+    seen = set()
+    next_id = max((discount.discountID for discount in discounts), default=0) + 1
+    for discount in discounts:
+        if discount.discountID in seen:
+            print(f"  discount ID {discount.discountID} was used twice: the later one is now {next_id}")
+            discount.discountID, next_id = next_id, next_id + 1
+        seen.add(discount.discountID)
+        redeemed = sum(discount.redemptions.values())
+        if redeemed > discount.uses:
+            print(f"  discount {discount.discountID}: uses raised from {discount.uses} to {redeemed}")
+            discount.uses = redeemed
+
+
+def compact(args):
+    """
+    Rewrite each data file in the current schema with full blocks, hash
+    passwords stored in clear, and repair what check reports as compact's to
+    fix: tickets (see ticket_repairs),
+    duplicate discount IDs, discount use counts below their redemptions, and
+    duplicate or stale waitlist entries. Also trim torn entries off the gate
+    logs and remove temp files and snapshots left behind by crashed processes.
+    """
+    events = main.default_events()
+    try:
+        user_ids = {user.userID for user in main.read_records(main.USERS_FILE, main.UserCodec())}
+    except FileNotFoundError:
+        user_ids = set()
+    catalogue = {event.eventID: event for event in events}
+    archive = open_archive(events)
+    to_archive = set()
+
+    for path, codec in ((main.USERS_FILE, main.UserCodec()), (main.TICKETS_FILE, main.TicketCodec(events)),
+                        (main.DISCOUNTS_FILE, main.DiscountCodec()), (main.WAITLIST_FILE, main.WaitlistCodec())):
+        try:
+            with open(path, "rb") as f:
+                before = f.read()
+            records = list(main.read_records(path, codec))
+        except FileNotFoundError:
+            continue
+        kept = records
+        if path == main.USERS_FILE:
+            hash_passwords(records)
+        elif path == main.TICKETS_FILE:
+            kept = repair_tickets(records, codec, archive, to_archive)
+        elif path == main.DISCOUNTS_FILE:
+            repair_discounts(records)
+        elif path == main.WAITLIST_FILE:
+            kept, seen = [], set()
+            for entry in records:
+                if entry.userID in user_ids and entry.eventID in catalogue and (entry.eventID, entry.userID) not in seen:
+                    seen.add((entry.eventID, entry.userID))
+                    kept.append(entry)
+        after = main.encode_records(codec, kept)
+        if after != before:
+            main.atomic_write(path, after)
+        dropped = f", dropped {len(records) - len(kept)} records" if len(kept) < len(records) else ""
+        print(f"  {path:16} {len(before):>10,} -> {len(after):>10,} bytes{dropped}")
+
+    if to_archive:
+        store = main.TicketStore(events, archive=archive)
+        store.load()
+        moved = archive.archive(store, [catalogue[eventID] for eventID in sorted(to_archive)])
+        print(f"  moved {moved:,} tickets of archived events into the archive")
+
+    size = main.GateIndex.LOG_ENTRY.size
+    for name in sorted(os.listdir(".")):
+        if name.startswith("gate-") and name.endswith(".log"):
+            length = os.path.getsize(name)
+            if length % size:
+                with open(name, "r+b") as f:
+                    f.truncate(length - length % size)
+                print(f"  {name:16} trimmed a torn entry")
+
+    # Live snapshots and in-flight writes are young; only sweep up old leftovers
+    cutoff = time.time() - args.max_age * 3600
+    removed = 0
+    for name in os.listdir("."):
+        leftover = name.startswith(".snapshot-") or (
+            name.endswith(".tmp") and any(name.startswith(path + ".") for path in main.DATA_FILES))
+        if leftover and os.path.getmtime(name) < cutoff:
+            if os.path.isdir(name):
+                import shutil
+                shutil.rmtree(name, ignore_errors=True)
+            else:
+                os.unlink(name)
+            removed += 1
+    if removed:
+        print(f"  removed {removed} leftover temp files and snapshots")
+    print("✅ Compaction finished.")
+    return 0
+
+
+def archive_events(args):
+    """
+    Move the tickets of finished events out of the ticket file into compressed
+    per-event segments. Archived events are closed for sale, so by default
+    only events that ended more than --after-days ago are archived.
+    """
+    events = main.default_events()
+    archive = open_archive(events)
+    if args.event:
+        catalogue = {event.eventID: event for event in events}
+        unknown = [eventID for eventID in args.event if eventID not in catalogue]
+        if unknown:
+            print(f"❌ Unknown event IDs: {', '.join(map(str, unknown))}")
+            return 1
+        finished = [catalogue[eventID] for eventID in args.event]
+    else:
+        finished = archive.finished_events(after_days=args.after_days)
+    if not finished:
+        print("Nothing to archive.")
+        return 0
+    for event in finished:
+        print(f"  {event.name} ({event.date})")
+    if args.dry_run:
+        return 0
+
+    store = main.TicketStore(events, archive=archive)
+    store.load()
+    before = os.path.getsize(main.TICKETS_FILE) if os.path.exists(main.TICKETS_FILE) else 0
+    moved = archive.archive(store, finished)
+    print(f"✅ Archived {moved:,} tickets from {len(finished)} events; {main.TICKETS_FILE} went from "
+          f"{before:,} to {os.path.getsize(main.TICKETS_FILE):,} bytes.")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Grand Prix admin tools (no GUI).")
+    parser.add_argument("--data", default=".", help="directory holding the data files")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    report = commands.add_parser("report", help="sales or occupancy report")
+    report.add_argument("kind", choices=("sales", "occupancy"))
+    report.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    report.set_defaults(run=lambda args: report_sales(args) if args.kind == "sales" else report_occupancy(args))
+
+    exporter = commands.add_parser("export", help="write a data file as CSV or JSON")
+    exporter.add_argument("kind", choices=sorted(EXPORTS))
+    exporter.add_argument("--format", choices=("csv", "json"), default="csv")
+    exporter.add_argument("-o", "--output", help="file to write (default: standard output)")
+    exporter.add_argument("--archived", action="store_true", help="include archived tickets (tickets only)")
+    exporter.set_defaults(run=export)
+
+    importer = commands.add_parser("import", help="add users from a CSV file (app closed)")
+    importer.add_argument("kind", choices=("users",))
+    importer.add_argument("file", help="CSV with name, email, password and optional admin columns")
+    importer.add_argument("--dry-run", action="store_true", help="validate and hash, but do not save")
+    importer.set_defaults(run=import_users)
+
+    checker = commands.add_parser("check", help="look for inconsistent data")
+    checker.set_defaults(run=check)
+
+    compactor = commands.add_parser("compact", help="rewrite and tidy the data files (app closed)")
+    compactor.add_argument("--max-age", type=float, default=1.0,
+                           help="hours after which temp files and snapshots count as leftovers")
+    compactor.set_defaults(run=compact)
+
+    archiver = commands.add_parser("archive", help="move tickets of finished events to the archive (app closed)")
+    archiver.add_argument("--after-days", type=int, default=main.ARCHIVE_AFTER_DAYS,
+                          help="archive events that ended more than this many days ago")
+    archiver.add_argument("--event", type=int, action="append", help="archive this event ID now (repeatable)")
+    archiver.add_argument("--dry-run", action="store_true", help="only list the events that would be archived")
+    archiver.set_defaults(run=archive_events)
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    os.chdir(args.data)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(run())
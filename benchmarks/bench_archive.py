@@ -0,0 +1,86 @@
+"""Measure what archiving finished events saves: ticket file size, load time and history lookups.
+
+Run from the project root: python benchmarks/bench_archive.py [tickets] [events]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+
+
+def make_events(count):
+    """count weekly events, all but the last four already over."""
+    start = date.today() - timedelta(weeks=count - 4)
+    return [main.Event(i, f"Race {i}", start + timedelta(weeks=i - 1), main.Venue(i, f"Circuit {i}", 10000, 100, 100))
+            for i in range(1, count + 1)]
+
+
+def write_tickets(path, events, ticket_count, user_count):
+    types = main.TicketCodec.TYPES
+    tickets = []
+    for i in range(ticket_count):
+        event = events[i % len(events)]
+        ticket = types[i % len(types)](i + 1, 100)
+        ticket.event = event
+        ticket.seat = event.venue.seats[(i // len(events)) // 100 % 100][(i // len(events)) % 100]
+        ticket.ownerID = i * 7919 % user_count + 1
+        tickets.append(ticket)
+    main.atomic_write(path, main.encode_records(main.TicketCodec(), tickets))
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def load_store(events, path, archive):
+    store = main.TicketStore(events, path=path, archive=archive)
+    store.load()
+    return store
+
+
+def run(ticket_count, event_count):
+    user_count = ticket_count // 5
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "tickets.dat")
+        events = make_events(event_count)
+        write_tickets(path, events, ticket_count, user_count)
+        archive = main.TicketArchive(events, directory=os.path.join(directory, "archive")).load()
+        print(f"{ticket_count:,} tickets, {event_count} events ({event_count - 4} finished), {user_count:,} users")
+
+        store, before = timed(lambda: load_store(events, path, archive))
+        size_before = os.path.getsize(path)
+        print(f"  before: ticket file {size_before / 2**20:6.1f} MB, loaded in {before * 1000:6.0f} ms")
+
+        moved, elapsed = timed(lambda: archive.archive(store, archive.finished_events(after_days=0)))
+        segments = sum(os.path.getsize(os.path.join(archive.directory, name))
+                       for name in os.listdir(archive.directory))
+        print(f"  archived {moved:,} tickets in {elapsed * 1000:.0f} ms: segments and index "
+              f"{segments / 2**20:.1f} MB ({segments / moved:.1f} bytes per ticket, "
+              f"{(size_before - os.path.getsize(path)) / moved:.0f} in the ticket file)")
+
+        _, after = timed(lambda: load_store(events, path, archive))
+        print(f"  after:  ticket file {os.path.getsize(path) / 2**20:6.1f} MB, loaded in {after * 1000:6.0f} ms")
+        _, index_load = timed(lambda: main.TicketArchive(events, directory=archive.directory).load())
+        print(f"  archive index loaded in {index_load * 1000:.1f} ms")
+
+        # A user's past tickets: the owner filters skip segments the user bought nothing in
+        cold = main.TicketArchive(events, directory=archive.directory).load()
+        found, first = timed(lambda: cold.for_owner(1))
+        _, again = timed(lambda: cold.for_owner(1))
+        print(f"  past tickets of one user: {len(found)} found, {first * 1000:.0f} ms cold, "
+              f"{again * 1000:.1f} ms with {cold.CACHED_SEGMENTS} segments cached")
+        rare = user_count + 1  # a user who bought nothing before
+        _, none = timed(lambda: cold.for_owner(rare))
+        print(f"  user with no past tickets: {none * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    tickets = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    events = int(sys.argv[2]) if len(sys.argv) > 2 else 24
+    run(tickets, events)
@@ -0,0 +1,54 @@
+"""Compare per-payment card validation with the batch Payment.validate_cards API.
+
+Run from the project root: python benchmarks/bench_card_validation.py [count]
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import Payment
+
+
+def make_cards(count, seed=42):
+    """Build a mix of valid, mistyped and expired cards."""
+    rng = random.Random(seed)
+    cards = []
+    for _ in range(count):
+        body = [rng.randrange(10) for _ in range(15)]
+        total = sum(Payment.LUHN_DOUBLED[d] if i % 2 == 0 else d
+                    for i, d in enumerate(reversed(body)))
+        number = "".join(map(str, body)) + str(-total % 10)
+        if rng.random() < 0.1:
+            number = number[:-1] + str((int(number[-1]) + 1) % 10)
+        expiry = f"{rng.randint(1, 12):02d}/{rng.randint(20, 35):02d}"
+        cards.append((number, expiry))
+    return cards
+
+
+def legacy_validate(card_number, expiry):
+    """The original per-payment check: string patterns, format only."""
+    return re.match(r'^\d{16}$', card_number) and re.match(r'^\d{2}/\d{2}$', expiry)
+
+
+def timed(label, func, count):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed * 1000:8.1f} ms  {count / elapsed:12,.0f} cards/s")
+
+
+def main(count=100_000):
+    cards = make_cards(count)
+    print(f"Validating {count:,} cards")
+    timed("legacy re.match, format only", lambda: [legacy_validate(n, e) for n, e in cards], count)
+    timed("per-payment validate_card()",
+          lambda: [Payment(i, 0, "Credit/Debit", n, e).validate_card() for i, (n, e) in enumerate(cards)],
+          count)
+    timed("batch validate_cards() (+Luhn, expiry)", lambda: Payment.validate_cards(cards), count)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
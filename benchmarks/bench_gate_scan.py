@@ -0,0 +1,72 @@
+"""Measure gate-scan throughput for online gates (GateIndex) and offline scanners (GateSnapshot).
+
+Run from the project root: python benchmarks/bench_gate_scan.py [tickets]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+
+
+def make_store(ticket_count):
+    """A ticket store with ticket_count tickets for one event (seats reused, as only IDs matter)."""
+    events = main.default_events()
+    event = events[0]
+    store = main.TicketStore(events)
+    for i in range(ticket_count):
+        ticket = main.SingleRacePass(i + 1, 100)
+        ticket.event = event
+        ticket.seat = event.venue.seats[(i // 10) % event.venue.rows][i % event.venue.seats_per_row]
+        ticket.ownerID = i % 1000 + 1
+        store.add(ticket)
+    return event, store
+
+
+def rate(label, scanner, codes):
+    start = time.perf_counter()
+    results = [scanner.scan(code) for code in codes]
+    elapsed = time.perf_counter() - start
+    counts = {}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+    print(f"  {label:32} {len(codes) / elapsed:>10,.0f} scans/s  {counts}")
+
+
+def run(ticket_count):
+    event, store = make_store(ticket_count)
+    signer = main.TicketCodeSigner(os.urandom(32))
+    codes = [signer.code_for(ticket) for ticket in store.all()]
+    random.Random(1).shuffle(codes)
+    # A few fans come back, and a few codes are tampered with
+    rescans = codes[:len(codes) // 100]
+    forged = [code[:-2] + ("AA" if code[-2:] != "AA" else "BB") for code in codes[:len(codes) // 100]]
+    print(f"{ticket_count:,} tickets for {event.name}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        index = main.GateIndex.from_store(store, event.eventID, signer,
+                                          log_path=os.path.join(directory, "gate.log"))
+        print(f"  index built in {(time.perf_counter() - start) * 1000:.0f} ms")
+        first_half = codes[:len(codes) // 2]
+        rate("online, logged to disk", index, first_half + rescans + forged)
+
+        snapshot = index.snapshot()
+        print(f"  snapshot: {len(snapshot) / 1024:.0f} KB "
+              f"({len(snapshot) * 8 / ticket_count:.1f} bits per ticket)")
+        scanner = main.GateSnapshot(snapshot, signer)
+        rate("offline snapshot", scanner, codes[len(codes) // 2:] + rescans)
+
+        # Fans who used a ticket at an online gate and again at an offline one
+        start = time.perf_counter()
+        doubles = index.merge(scanner.scans + [(ticketID, 1) for ticketID in list(index.used)[:50]])
+        print(f"  merged {len(scanner.scans):,} offline scans in "
+              f"{(time.perf_counter() - start) * 1000:.0f} ms, {len(doubles)} double entries found")
+        index.close()
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
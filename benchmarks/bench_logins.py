@@ -0,0 +1,51 @@
+"""Measure login throughput with salted PBKDF2 hashes, in-process and through the worker pool.
+
+Run from the project root: python benchmarks/bench_logins.py [logins] [iterations]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+
+
+def make_users(count, iterations):
+    hashed = main.hash_password("hunter2", iterations)  # one hash, reused to keep setup quick
+    return [main.User(i, f"Fan {i}", f"fan{i}@example.com", hashed) for i in range(1, count + 1)]
+
+
+def run(logins, iterations):
+    users = make_users(logins, iterations)
+    workers = os.cpu_count() or 1
+    print(f"{logins} logins, {iterations:,} PBKDF2 iterations, {workers} CPU(s)")
+
+    # On the calling thread: what login cost the GUI before the pool
+    start = time.perf_counter()
+    for user in users:
+        assert user.login(user.email, "hunter2")
+    serial = time.perf_counter() - start
+    print(f"  in-process:  {logins / serial:8.1f} logins/s  ({serial / logins * 1000:.0f} ms each, "
+          f"blocking the caller)")
+
+    # Through the pool; the caller only waits on futures and keeps ticking
+    service = main.CredentialService(workers=workers, iterations=iterations)
+    service.authenticate(users[:1], users[0].email, "hunter2").result()  # start the workers
+    start = time.perf_counter()
+    futures = [service.authenticate(users, user.email, "hunter2") for user in users]
+    last, worst_gap = time.perf_counter(), 0.0
+    while not all(f.done() for f in futures):
+        time.sleep(0.01)  # stands in for the Tk event loop
+        now = time.perf_counter()
+        worst_gap, last = max(worst_gap, now - last), now
+    pooled = time.perf_counter() - start
+    assert all(f.result().user is not None for f in futures)
+    service.shutdown()
+    print(f"  pool:        {logins / pooled:8.1f} logins/s  ({logins / pooled / workers:.1f} per core), "
+          f"longest event-loop stall {worst_gap * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else main.PASSWORD_ITERATIONS
+    run(logins, iterations)
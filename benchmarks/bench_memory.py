@@ -0,0 +1,121 @@
+"""Measure the memory held by loaded users and tickets, slotted model vs the old dict-based one.
+
+Run from the project root: python benchmarks/bench_memory.py [tickets] [users]
+"""
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+
+
+class DictUser:
+    """A user laid out like before __slots__: attributes in a __dict__, eager history indexes."""
+
+    def __init__(self, user):
+        self.userID = user.userID
+        self.name = user.name
+        self.email = user.email
+        self.password = user.password
+        self.purchase_history = DictHistory(user.userID)
+
+
+class DictHistory:
+    """A purchase history that built its empty indexes up front."""
+
+    def __init__(self, ownerID):
+        self.ownerID = ownerID
+        self._store = None
+        self._legacy = []
+        self._by_id = {}
+        self._by_event = {}
+        self._by_date = {}
+        self._loaded = False
+
+
+class DictTicket:
+    """A ticket laid out like before __slots__, with issueDate as a datetime."""
+
+    def __init__(self, ticket, seat):
+        self.ticketID = ticket.ticketID
+        self.price = ticket.price
+        self.issueDate = datetime.fromtimestamp(ticket.issued_us / 1e6)
+        self.seat = seat
+        self.event = ticket.event
+        self.ownerID = ticket.ownerID
+
+
+def write_data(directory, ticket_count, user_count):
+    """Write users.dat and tickets.dat with tickets spread over the default events."""
+    events = main.default_events()
+    types = main.TicketCodec.TYPES
+    users = [main.User(i, f"Fan {i}", f"fan{i}@example.com", "secret") for i in range(1, user_count + 1)]
+    tickets = []
+    for i in range(ticket_count):
+        event = events[i % len(events)]
+        ticket = types[i % len(types)](i + 1, 100)
+        ticket.event = event
+        ticket.seat = event.venue.seats[(i // 10) % event.venue.rows][i % event.venue.seats_per_row]
+        ticket.ownerID = users[i % user_count].userID
+        tickets.append(ticket)
+    users_path = os.path.join(directory, "users.dat")
+    tickets_path = os.path.join(directory, "tickets.dat")
+    main.atomic_write(users_path, main.encode_records(main.UserCodec(), users))
+    main.atomic_write(tickets_path, main.encode_records(main.TicketCodec(), tickets))
+    return users_path, tickets_path
+
+
+def measure(load):
+    """Return (bytes still allocated, peak bytes) for the objects load() returns."""
+    gc.collect()
+    tracemalloc.start()
+    data = load()
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del data
+    gc.collect()
+    return current, peak
+
+
+def run(ticket_count, user_count):
+    with tempfile.TemporaryDirectory() as directory:
+        users_path, tickets_path = write_data(directory, ticket_count, user_count)
+
+        def load_slotted():
+            # What GrandPrixApp.load_data keeps: users plus the ticket store
+            users = list(main.read_records(users_path, main.UserCodec()))
+            store = main.TicketStore(main.default_events(), path=tickets_path)
+            store.load(users)
+            return users, store
+
+        def load_dicts():
+            # The same data and indexes in the old layout: one Seat per pickled ticket
+            users = [DictUser(u) for u in main.read_records(users_path, main.UserCodec())]
+            tickets, by_owner = {}, {}
+            for ticket in main.read_records(tickets_path, main.TicketCodec()):
+                seat = main.Seat(ticket.seat.seatID) if ticket.seat else None
+                ticket = tickets[ticket.ticketID] = DictTicket(ticket, seat)
+                by_owner.setdefault(ticket.ownerID, {})[ticket.ticketID] = ticket
+            return users, tickets, by_owner
+
+        print(f"{ticket_count:,} tickets, {user_count:,} users")
+        print(f"  {'':24} {'held MB':>10} {'peak MB':>10} {'per ticket+user B':>18}")
+        results = {}
+        for name, load in (("dict-based (before)", load_dicts), ("slotted (now)", load_slotted)):
+            current, peak = measure(load)
+            results[name] = current
+            print(f"  {name:24} {current / 2**20:>10.1f} {peak / 2**20:>10.1f} "
+                  f"{current / (ticket_count + user_count):>18.0f}")
+        before, after = results.values()
+        print(f"  reduction: {(1 - after / before):.0%}")
+
+
+if __name__ == "__main__":
+    tickets = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+    run(tickets, users)
@@ -0,0 +1,105 @@
+"""Compare the record file format with pickle for a large ticket and user set.
+
+Run from the project root: python benchmarks/bench_record_format.py [tickets]
+"""
+import gc
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+
+
+class LegacyTicket:
+    """A ticket laid out like the old tickets.pkl entries, with issueDate as a datetime."""
+
+    def __init__(self, ticket):
+        self.ticketID = ticket.ticketID
+        self.price = ticket.price
+        self.issueDate = ticket.issueDate
+        self.seat = ticket.seat
+        self.event = ticket.event
+
+
+def make_data(ticket_count):
+    """Build users and tickets spread over the default events, like a busy season."""
+    events = main.default_events()
+    types = main.TicketCodec.TYPES
+    users = [main.User(i, f"Fan {i}", f"fan{i}@example.com", "secret") for i in range(1, ticket_count // 10 + 2)]
+    tickets = []
+    for i in range(ticket_count):
+        event = events[i % len(events)]
+        ticket = types[i % len(types)](i + 1, 100)
+        ticket.event = event
+        ticket.seat = event.venue.seats[(i // 10) % event.venue.rows][i % event.venue.seats_per_row]
+        ticket.ownerID = users[i % len(users)].userID
+        tickets.append(ticket)
+    return events, users, tickets
+
+
+def timed(func, repeat=5):
+    """
+    Return the best of several runs, with the result of the last one. Like
+    timeit, the garbage collector is paused while timing so that collections
+    triggered by the objects already alive do not swamp the measurement.
+    """
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def compare(label, objects, codec, directory, legacy_objects=None):
+    record_path = os.path.join(directory, label + ".dat")
+    rows = [("pickle", objects)]
+    if legacy_objects is not None:
+        rows.insert(0, ("pickle, old layout", legacy_objects))
+
+    print(f"{label}: {len(objects):,} records")
+    print(f"  {'':20} {'write ms':>10} {'read ms':>10} {'size KB':>10}")
+    for name, data in rows:
+        pickle_path = os.path.join(directory, label + ".pkl")
+
+        def dump_pickle():
+            with open(pickle_path, 'wb') as f:
+                pickle.dump(data, f)
+
+        def load_pickle():
+            with open(pickle_path, 'rb') as f:
+                return pickle.load(f)
+
+        dump, _ = timed(dump_pickle)
+        load, _ = timed(load_pickle)
+        print(f"  {name:20} {dump * 1000:10.1f} {load * 1000:10.1f} {os.path.getsize(pickle_path) / 1024:10.0f}")
+
+    def dump_records():
+        with open(record_path, 'wb') as f:
+            f.write(main.encode_records(codec, objects))
+
+    dump, _ = timed(dump_records)
+    load, loaded = timed(lambda: list(main.read_records(record_path, codec)))
+    assert len(loaded) == len(objects)
+    print(f"  {'records':20} {dump * 1000:10.1f} {load * 1000:10.1f} {os.path.getsize(record_path) / 1024:10.0f}")
+
+
+def main_bench(ticket_count=200_000):
+    events, users, tickets = make_data(ticket_count)
+    with tempfile.TemporaryDirectory() as directory:
+        compare("tickets", tickets, main.TicketCodec(events), directory,
+                legacy_objects=[LegacyTicket(ticket) for ticket in tickets])
+        compare("users", users, main.UserCodec(), directory)
+
+
+if __name__ == "__main__":
+    main_bench(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
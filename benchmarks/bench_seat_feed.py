@@ -0,0 +1,63 @@
+"""Measure the seat feed's fan-out: one booking stream watched by thousands of seat maps.
+
+Run from the project root: python benchmarks/bench_seat_feed.py [watchers] [bookings]
+"""
+import os
+import random
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+
+
+def run(watcher_count, booking_count, rounds=20):
+    venue = main.Venue(1, "Big Circuit", 10000, 100, 100)
+    event = main.Event(1, "Big GP", date.today(), venue)
+    feed = main.SeatFeed(event, history=4096)
+    seats = [seat for row in venue.seats for seat in row]
+    rng = random.Random(1)
+    # Watchers have all drawn the map once; remote ones hold only a sequence number
+    cursors = [feed.sequence] * watcher_count
+    print(f"{watcher_count:,} watchers of {len(seats):,} seats, {booking_count:,} bookings in {rounds} poll rounds")
+
+    published = polled = 0.0
+    delta_bytes = snapshot_bytes = 0
+    per_round = booking_count // rounds
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(per_round):
+            # A booking holds 1-4 seats, then most are sold and the rest released
+            chosen = rng.sample(seats, rng.randint(1, 4))
+            feed.publish(chosen, main.SeatFeed.HELD)
+            feed.publish(chosen, main.SeatFeed.SOLD if rng.random() < 0.8 else main.SeatFeed.FREE)
+        published += time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i, cursor in enumerate(cursors):
+            cursors[i], message = feed.messages_since(cursor)
+            delta_bytes += len(message) if message else 0
+        polled += time.perf_counter() - start
+        snapshot_bytes += len(feed.snapshot()) * watcher_count  # resending the whole map instead
+
+    print(f"  publish: {published / feed.sequence * 1e6:6.2f} µs per change, independent of the watcher count")
+    print(f"  poll:    {polled / (rounds * watcher_count) * 1e6:6.2f} µs per watcher per round "
+          f"({(published + polled) / rounds * 1000:.0f} ms per round in all)")
+    print(f"  sent:    {delta_bytes / 2**20:6.1f} MB of deltas vs {snapshot_bytes / 2**20:.1f} MB "
+          f"re-sending full maps ({delta_bytes / snapshot_bytes:.1%})")
+
+    # The Tk seat map: apply a round of changes, touching only the seats that changed
+    sequence, states, _ = feed.changes_since(-1)
+    for _ in range(per_round):
+        feed.publish(rng.sample(seats, 2), main.SeatFeed.HELD)
+    start = time.perf_counter()
+    sequence, states, changed = feed.changes_since(sequence)
+    elapsed = time.perf_counter() - start
+    print(f"  seat map poll: {len(changed)} seats to redraw out of {len(seats):,}, read in {elapsed * 1e6:.0f} µs")
+
+
+if __name__ == "__main__":
+    watchers = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    bookings = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    run(watchers, bookings)
@@ -0,0 +1,55 @@
+"""Measure waitlist joins, leaves and a burst of cancellations on a large waitlist.
+
+Run from the project root: python benchmarks/bench_waitlist.py [waiters] [cancellations]
+"""
+import os
+import random
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+
+
+def timed(label, count, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:36} {elapsed * 1000:8.1f} ms  ({elapsed / max(1, count) * 1e6:.2f} µs each)")
+    return result
+
+
+def run(waiters, cancellations):
+    # A venue big enough that every cancellation gives back a different sold seat
+    rows = -(-cancellations // 100)
+    event = main.Event(1, "Big GP", date.today(), main.Venue(1, "Big Circuit", rows * 100, rows, 100))
+    events = [event]
+    now = [0.0]
+    waitlist = main.Waitlist(events, hold_seconds=600, clock=lambda: now[0])
+    types = main.TicketCodec.TYPES
+    rng = random.Random(1)
+    print(f"{waiters:,} waiting for {event.name}, {cancellations:,} cancellations in a burst")
+
+    timed("join", waiters, lambda: [waitlist.join(event.eventID, user, types[rng.randrange(len(types))])
+                                    for user in range(1, waiters + 1)])
+    leavers = rng.sample(range(1, waiters + 1), waiters // 10)
+    timed("leave (10%)", len(leavers), lambda: [waitlist.leave(event.eventID, user) for user in leavers])
+
+    seats = [seat for row in event.venue.seats for seat in row]
+    for seat in seats:
+        seat.is_reserved = True
+    burst = seats[:cancellations]
+    offers = timed("cancellation -> offer", cancellations,
+                   lambda: [waitlist.seat_released(event, seat) for seat in burst])
+    assert all(offer is not None for offer in offers)
+
+    # Nobody answers: every offer expires and moves on to the next person
+    now[0] += 601
+    made = timed("expire all offers -> next offers", cancellations, waitlist.expire)
+    print(f"  {len(made):,} new offers, {waitlist.waiting(event.eventID):,} still waiting")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20_000)
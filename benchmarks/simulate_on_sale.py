@@ -0,0 +1,220 @@
+"""Simulate an on-sale rush: many virtual buyers booking the same seats at once.
+
+Each buyer runs the app's booking path on its own thread: hold_tickets
+reserves the seats, the payment goes through a PaymentProcessor on a mock
+gateway, then the tickets are added to the buyer's history and the ticket
+store, or the seats are given back through the app's release path
+(Waitlist.seat_released) if the payment fails or the buyer abandons
+checkout. Holds, sales and releases are published to the event's seat feed
+as in the app. When every buyer has finished, the result is checked.
+An oversold seat, a duplicate ticket ID, a lost ticket or a leaked seat
+hold is a hard failure, and the exit status is 1.
+
+Run from the project root: python benchmarks/simulate_on_sale.py --help
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+
+
+def seat_weights(seats, rows, distribution, skew, hot_share):
+    """Return one weight per seat: how likely a buyer is to go for it."""
+    if distribution == "uniform":
+        return [1.0] * len(seats)
+    # Rank seats by how good they are: front rows first, centre before the sides
+    middle = (len(seats) // rows - 1) / 2
+    ranked = sorted(range(len(seats)), key=lambda i: (i // (len(seats) // rows),
+                                                      abs(i % (len(seats) // rows) - middle)))
+    weights = [0.0] * len(seats)
+    if distribution == "zipf":
+        for rank, i in enumerate(ranked, 1):
+            weights[i] = 1 / rank ** skew
+    else:  # hotspot: hot_share of the seats draw skew times the interest of the rest
+        hot = max(1, int(len(seats) * hot_share))
+        for rank, i in enumerate(ranked):
+            weights[i] = skew if rank < hot else 1.0
+    return weights
+
+
+def percentiles(samples, points=(50, 90, 99)):
+    if not samples:
+        return {point: 0.0 for point in points + (100,)}
+    ordered = sorted(samples)
+    return {point: ordered[min(len(ordered) - 1, int(len(ordered) * point / 100))]
+            for point in points + (100,)}
+
+
+class Counters:
+    """Thread-safe tallies of what the buyers ran into."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.hold_latency = []
+        self.booking_latency = []
+        self.issued = []  # every ticket handed to a buyer
+
+    def add(self, name, amount=1):
+        with self.lock:
+            self.values[name] = self.values.get(name, 0) + amount
+
+
+def run(args):
+    venue = main.Venue(1, "Simulated Circuit", args.rows * args.seats_per_row, args.rows, args.seats_per_row)
+    event = main.Event(1, "Simulated GP", date.today(), venue)
+    store = main.TicketStore([event])
+    store.load_tickets([], [])
+    feeds = main.SeatFeeds()
+    waitlist = main.Waitlist([event], feeds=feeds)  # nobody waiting, so released seats are freed
+    seats = [seat for row in venue.seats for seat in row]
+    weights = seat_weights(seats, args.rows, args.distribution, args.skew, args.hot_share)
+    cum_weights = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cum_weights.append(total)
+
+    users = [main.User(n, f"Buyer {n}", f"buyer{n}@example.com", "x") for n in range(1, args.buyers + 1)]
+    for user in users:
+        user.purchase_history.attach(store, user.userID)
+    gateway = main.MockPaymentGateway(latency=args.pay_latency, jitter=args.pay_latency / 2,
+                                      decline_rate=args.decline_rate, seed=args.seed)
+    payments = main.PaymentProcessor(gateway, workers=args.concurrency, timeout=5.0, retries=1, backoff=0.01)
+    counters = Counters()
+
+    def buyer(user):
+        rng = random.Random(args.seed * 1_000_003 + user.userID)
+        wanted = rng.randint(1, args.max_seats)
+        started = time.perf_counter()
+        for _ in range(args.retries + 1):
+            # Pick seats that looked free on the seat map a moment ago
+            free = [seat for seat in rng.choices(seats, cum_weights=cum_weights, k=wanted * 4)
+                    if not seat.is_reserved]
+            choice = list(dict.fromkeys(free))[:wanted]
+            if len(choice) < wanted:
+                choice = [seat for seat in seats if not seat.is_reserved][:wanted]
+                if len(choice) < wanted:
+                    counters.add("sold out")
+                    return
+            time.sleep(rng.uniform(0, args.think_time))  # the seat map goes stale meanwhile
+            counters.add("holds attempted")
+            hold_started = time.perf_counter()
+            try:
+                tickets, price = main.hold_tickets(choice, event, main.SingleRacePass, store.next_ticket_id)
+            except main.SeatUnavailableError:
+                counters.add("hold conflicts")
+                continue
+            finally:
+                with counters.lock:
+                    counters.hold_latency.append(time.perf_counter() - hold_started)
+            feeds.publish(event, choice, main.SeatFeed.HELD)
+
+            if rng.random() < args.abandon_rate:
+                for ticket in tickets:  # abandoned checkout: the rollback path
+                    waitlist.seat_released(event, ticket.seat)
+                counters.add("abandoned")
+                return
+            payment = main.Payment(user.userID, price, "Credit/Debit", "4111111111111111", "12/99")
+            result = payments.submit(payment).wait()
+            if not result.approved:
+                for ticket in tickets:
+                    waitlist.seat_released(event, ticket.seat)
+                counters.add("payment failed")
+                return
+            feeds.publish(event, choice, main.SeatFeed.SOLD)
+            for ticket in tickets:
+                user.purchase_history.add_ticket(ticket)
+            with counters.lock:
+                counters.issued.extend(tickets)
+                counters.booking_latency.append(time.perf_counter() - started)
+            counters.add("bookings")
+            return
+        counters.add("gave up after conflicts")
+
+    previous_interval = sys.getswitchinterval()
+    sys.setswitchinterval(args.switch_interval)  # switch threads often to shake out races
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for future in [pool.submit(buyer, user) for user in users]:
+                future.result()
+    finally:
+        elapsed = time.perf_counter() - started
+        sys.setswitchinterval(previous_interval)
+        payments.shutdown()
+
+    return report(args, counters, store, seats, elapsed)
+
+
+def report(args, counters, store, seats, elapsed):
+    values = counters.values
+    print(f"{args.buyers:,} buyers on {args.concurrency} threads, {len(seats):,} seats, "
+          f"{args.distribution} demand")
+    for name in ("bookings", "holds attempted", "hold conflicts", "abandoned", "payment failed",
+                 "gave up after conflicts", "sold out"):
+        print(f"  {name:24} {values.get(name, 0):>8,}")
+    print(f"  {'elapsed':24} {elapsed:>8.2f} s")
+    print(f"  {'throughput':24} {values.get('bookings', 0) / elapsed:>8,.0f} bookings/s, "
+          f"{values.get('holds attempted', 0) / elapsed:,.0f} holds/s")
+    for label, samples in (("hold latency", counters.hold_latency), ("booking latency", counters.booking_latency)):
+        p = percentiles(samples)
+        print(f"  {label:24} p50 {p[50] * 1000:.2f} ms  p90 {p[90] * 1000:.2f} ms  "
+              f"p99 {p[99] * 1000:.2f} ms  max {p[100] * 1000:.2f} ms")
+
+    failures = []
+    owners = {}
+    for ticket in counters.issued:
+        owners.setdefault(id(ticket.seat), []).append(ticket)
+    oversold = {key: tickets for key, tickets in owners.items() if len(tickets) > 1}
+    if oversold:
+        failures.append(f"{len(oversold)} seats sold more than once, e.g. seat "
+                        f"{next(iter(oversold.values()))[0].seat.seatID}")
+    ids = [ticket.ticketID for ticket in counters.issued]
+    if len(set(ids)) != len(ids):
+        failures.append(f"{len(ids) - len(set(ids))} duplicate ticket IDs")
+    if len(store) != len(counters.issued):
+        failures.append(f"the store holds {len(store)} tickets but {len(counters.issued)} were sold")
+    reserved = sum(1 for seat in seats if seat.is_reserved)
+    if reserved != len(owners):
+        failures.append(f"{reserved} seats are reserved but {len(owners)} were sold (leaked holds)")
+
+    if failures:
+        print("❌ FAILED")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("✅ No oversold seats, duplicate ticket IDs or leaked holds.")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--buyers", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=200, help="buyer threads running at once")
+    parser.add_argument("--rows", type=int, default=40)
+    parser.add_argument("--seats-per-row", type=int, default=50)
+    parser.add_argument("--max-seats", type=int, default=4, help="seats per booking, 1 to this")
+    parser.add_argument("--distribution", choices=("uniform", "zipf", "hotspot"), default="zipf")
+    parser.add_argument("--skew", type=float, default=1.1,
+                        help="zipf exponent, or how much more a hotspot seat is wanted")
+    parser.add_argument("--hot-share", type=float, default=0.05, help="share of seats in the hotspot")
+    parser.add_argument("--retries", type=int, default=3, help="new seat picks after a hold conflict")
+    parser.add_argument("--think-time", type=float, default=0.002, help="max seconds between looking and holding")
+    parser.add_argument("--pay-latency", type=float, default=0.002)
+    parser.add_argument("--decline-rate", type=float, default=0.05)
+    parser.add_argument("--abandon-rate", type=float, default=0.1)
+    parser.add_argument("--switch-interval", type=float, default=1e-5)
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(run(parse_args()))
@@ -1,9 +1,44 @@
-import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-from datetime import datetime
+from collections import OrderedDict, deque, namedtuple
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from itertools import count, islice
+import base64
+import hashlib
+import heapq
+import hmac
+import io
+import math
 import pickle
+import queue
+import random
 import re
 import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+
+USERS_FILE = 'users.dat'
+TICKETS_FILE = 'tickets.dat'
+DISCOUNTS_FILE = 'discounts.dat'
+WAITLIST_FILE = 'waitlist.dat'
+DATA_FILES = (USERS_FILE, TICKETS_FILE, DISCOUNTS_FILE, WAITLIST_FILE)
+TIMESTAMP_EPOCH = datetime(1970, 1, 1)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+# Tk is imported when the GUI starts, so the admin command line (admin.py) and
+# the benchmarks can use this module on machines without a display
+tk = ttk = filedialog = messagebox = simpledialog = None
+
+def load_tk():
+    """Import tkinter and its dialogs into this module's globals."""
+    global tk, ttk, filedialog, messagebox, simpledialog
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox, simpledialog
 # -------------------- CUSTOM EXCEPTIONS --------------------#
 class InvalidEmailError(Exception):
     """Raised when an email format is invalid."""
@@ -20,10 +55,43 @@ class PaymentError(Exception):
 class InvalidDiscountError(Exception):
     """Raised when an invalid discount is applied."""
     pass
+
+class GatewayTimeoutError(PaymentError):
+    """Raised when the payment gateway does not answer in time."""
+    pass
+
+class GatewayUnavailableError(PaymentError):
+    """Raised when the payment gateway reports a temporary failure."""
+    pass
+
+class RecordFormatError(Exception):
+    """Raised when a data file is not a valid record file."""
+    pass
+
+class SeatUnavailableError(Exception):
+    """Raised when a seat being booked was taken by another buyer first."""
+    def __init__(self, seat):
+        super().__init__(f"Seat {seat.seatID} is already reserved.")
+        self.seat = seat
+
+class WaitlistError(Exception):
+    """Raised when a user cannot join or leave a waitlist."""
+    pass
 # -------------------- THE CLASS IMPLEMENTATIONS ----------------#
+# Domain classes use __slots__: there can be millions of tickets and hundreds
+# of thousands of users in memory, and a per-instance __dict__ roughly doubles
+# their size. Subclasses declare empty __slots__ so they stay dict-free.
+def restore_slots(obj, state):
+    """Set pickled attributes on a slotted object (older pickles hold a plain dict)."""
+    if isinstance(state, tuple):
+        state = {**(state[0] or {}), **state[1]}
+    for name, value in state.items():
+        setattr(obj, name, value)
+
 class User:
     """Represents a general user with personal information and ticket history."""
-    
+    __slots__ = ("userID", "name", "email", "password", "purchase_history")
+
     def __init__(self, userID, name, email, password):
         """Initialize a User with ID, name, email, and password."""
 
@@ -31,11 +99,14 @@ class User:
         self.name = name
         self.email = email
         self.password = password
-        self.purchase_history = PurchaseHistory()
+        self.purchase_history = PurchaseHistory(userID)
+
+    def __setstate__(self, state):
+        restore_slots(self, state)
 
     def login(self, email, password):
         """Check if the provided email and password match the user's credentials."""
-        return self.email == email and self.password == password
+        return self.email == email and verify_password(password, self.password)
 
     def view_history(self):
         """Return the list of tickets from the user's purchase history."""
@@ -43,22 +114,27 @@ class User:
 
 class Admin(User):
     """Represents an admin user who can view sales and manage discounts."""
+    __slots__ = ()
 
-    def view_sales_data(self):
-        """Return the number of tickets sold from the ticket data file."""
+    def view_sales_data(self, snapshot=None, archive=None):
+        """
+        Return the number of tickets sold (see is_sold) from the ticket data file
+        (or a snapshot of it), plus the archived tickets if an archive is given.
+        """
+        archived = len(archive) if archive is not None else 0
         try:
-            with open('tickets.pkl', 'rb') as f:
-                tickets = pickle.load(f)
-            return len(tickets)
-        except FileNotFoundError:
-            return 0
+            path = snapshot.path(TICKETS_FILE) if snapshot else TICKETS_FILE
+            return sum(1 for ticket in read_records(path, TicketCodec()) if is_sold(ticket)) + archived
+        except (FileNotFoundError, KeyError):
+            return archived
         
-    def manage_discounts(self):
+    def manage_discounts(self, manager=None):
         """Open a GUI window for managing discount entries."""
-        DiscountManager().manage_discounts()
+        (manager or DiscountManager()).manage_discounts()
 
 class Ticket:
     """Base class for different ticket types with price and seat/event info."""
+    __slots__ = ("ticketID", "price", "issued_us", "seat", "event", "ownerID")
 
     def __init__(self, ticketID, price):
         """Initialize a Ticket with an ID and price."""
@@ -67,6 +143,21 @@ class Ticket:
         self.issueDate = datetime.now()
         self.seat = None
         self.event = None  
+        self.ownerID = None
+
+    @property
+    def issueDate(self):
+        """Issue time as a datetime; stored as microseconds since 1970 (naive local time)."""
+        return TIMESTAMP_EPOCH + timedelta(microseconds=self.issued_us)
+
+    @issueDate.setter
+    def issueDate(self, value):
+        self.issued_us = (value - TIMESTAMP_EPOCH) // ONE_MICROSECOND
+
+    def __setstate__(self, state):
+        # Older pickles stored issueDate as a datetime and had no owner
+        self.ownerID = None
+        restore_slots(self, state)
 
     def calculate_price(self):
         """Return the base price of the ticket (can be overridden)."""
@@ -74,21 +165,25 @@ class Ticket:
 
 class SingleRacePass(Ticket):
     """Represents a single race pass ticket with a 5% discount."""
+    __slots__ = ()
     def calculate_price(self):
         return self.price * 0.95  # 5% discount
 
 class WeekendPackage(Ticket):
     """Represents a weekend package ticket with a 15% discount."""
+    __slots__ = ()
     def calculate_price(self):
         return self.price * 0.85  # 15% discount
 
 class SeasonMembership(Ticket):
     """Represents a season membership ticket with a 25% discount."""
+    __slots__ = ()
     def calculate_price(self):
         return self.price * 0.75  # 25% discount
 
 class GroupDiscount(Ticket):
     """Represents a group ticket, with discount applied based on quantity."""
+    __slots__ = ()
     
     def calculate_price(self, quantity):
         """Apply a 20% discount if 5 or more tickets are purchased."""
@@ -109,6 +204,14 @@ class Event:
         """Return a formatted string with event name, location, and date."""
         return f"{self.name} at {self.venue.location} on {self.date.strftime('%Y-%m-%d')}"
 
+def default_events():
+    """Return this season's events, each with a fresh, empty venue."""
+    return [
+        Event(1, "Silverstone GP", date(2025, 6, 1), Venue(1, "Silverstone Circuit", 150000, 10, 10)),
+        Event(2, "Monaco GP", date(2025, 6, 15), Venue(2, "Monaco Circuit", 120000, 10, 10)),
+        Event(3, "Yas Marina GP", date(2025, 7, 1), Venue(3, "Yas Marina Circuit", 130000, 10, 10))
+    ]
+
 class Venue:
     """Represents a venue with seating layout and capacity."""
     def __init__(self, venueID, location, capacity, rows, seats_per_row):
@@ -125,155 +228,2777 @@ class Venue:
         """Return a list of all seats that are not reserved."""
         return [seat for row in self.seats for seat in row if not seat.is_reserved]
 
-class Seat:
-    """Represents a seat in a venue."""
+    def get_seat(self, seatID):
+        """Return the seat with an ID like "3-5" (row-seat), or None."""
+        try:
+            row, number = (int(part) for part in seatID.split("-"))
+        except ValueError:
+            return None
+        if 1 <= row <= self.rows and 1 <= number <= self.seats_per_row:
+            return self.seats[row - 1][number - 1]
+        return None
+
+class Seat:
+    """Represents a seat in a venue."""
+    __slots__ = ("seatID", "is_reserved")
+
+    def __init__(self, seatID):
+        """Initialize a seat with a unique ID and reservation status."""
+        self.seatID = seatID
+        self.is_reserved = False
+
+    def __setstate__(self, state):
+        restore_slots(self, state)
+
+    def reserve(self):
+        """Reserve the seat if it's not already reserved."""
+        with SEAT_LOCK:
+            if not self.is_reserved:
+                self.is_reserved = True
+                return True
+            return False
+
+# Checking and reserving seats happens under one lock, so two buyers (GUI,
+# background or simulated threads) can never both get the same seat
+SEAT_LOCK = threading.Lock()
+
+def hold_seats(seats):
+    """Reserve all of the seats or none of them. Returns the seats that were already taken."""
+    with SEAT_LOCK:
+        taken = [seat for seat in seats if seat.is_reserved]
+        if not taken:
+            for seat in seats:
+                seat.is_reserved = True
+        return taken
+
+def hold_tickets(seats, event, ticket_type, next_ticket_id, quantity=None, held=()):
+    """
+    Reserve the seats all at once and make a priced ticket for each. A quantity
+    makes it a group booking; seats in held are already reserved for this buyer
+    (e.g. a waitlist offer). Returns (tickets, total price) or raises
+    SeatUnavailableError, in which case nothing was reserved.
+    """
+    taken = hold_seats([seat for seat in seats if seat not in held])
+    if taken:
+        raise SeatUnavailableError(taken[0])
+    tickets = []
+    total_price = 0
+    for seat in seats:
+        ticket = GroupDiscount(next_ticket_id(), 100) if quantity else ticket_type(next_ticket_id(), 100)
+        # For group discount, the price is calculated once for each seat
+        total_price += ticket.calculate_price(quantity) if quantity else ticket.calculate_price()
+        ticket.seat = seat
+        ticket.event = event
+        tickets.append(ticket)
+    return tickets, total_price
+
+class Discount:
+    """Represents a discount applied to ticket prices, optionally redeemable by promo code."""
+    __slots__ = ("discountID", "description", "percentage", "code", "valid_from", "valid_until",
+                 "max_uses", "per_user_limit", "uses", "redemptions")
+
+    def __init__(self, discountID, description, percentage, code=None, valid_from=None,
+                 valid_until=None, max_uses=None, per_user_limit=None):
+        """
+        Initialize a discount with ID, description, and percentage. The optional
+        promo code, validity dates (inclusive) and usage caps control redemption;
+        None means no limit.
+        """
+        self.discountID = discountID
+        self.description = description
+        self.percentage = percentage
+        self.code = code.strip().upper() if code else None
+        self.valid_from = valid_from
+        self.valid_until = valid_until
+        self.max_uses = max_uses
+        self.per_user_limit = per_user_limit
+        self.uses = 0
+        self.redemptions = {}  # userID -> times redeemed
+
+    def __setstate__(self, state):
+        # Older pickles only had the ID, description and percentage
+        self.__init__(None, None, None)
+        restore_slots(self, state)
+
+    def get_discountID(self):
+        return self.discountID
+    
+    def set_discountID(self, discountID):
+        self.discountID = discountID
+    
+    def get_description(self):
+        return self.description
+    
+    def set_description(self, description):
+        self.description = description
+    
+    def get_percentage(self):
+        return self.percentage
+    
+    def set_percentage(self, percentage):
+        self.percentage = percentage
+    
+    def apply_discount(self, amount):
+        """Return the price after applying the discount percentage."""
+        return amount * (1 - self.percentage/100)
+
+    def is_valid_on(self, day):
+        """Return True if the discount can be used on the given date."""
+        return ((self.valid_from is None or self.valid_from <= day)
+                and (self.valid_until is None or day <= self.valid_until))
+    
+class DiscountManager:
+    """
+    Discount catalogue and promo-code redemption. Discounts are cached in memory
+    and indexed by ID and code; the cache reloads when another process rewrites
+    the discounts file. Redemptions are held during checkout and counted against
+    the usage caps under one lock, so concurrent checkouts cannot overshoot them.
+    """
+    RELOAD_INTERVAL = 1.0  # seconds between checks of the discounts file
+
+    def __init__(self, path=DISCOUNTS_FILE, persistence=None):
+        """Load existing discounts from file or initialize an empty list."""
+        self.path = path
+        self.persistence = persistence
+        self.lock = threading.RLock()
+        self.discounts = []
+        self._by_id = {}
+        self._by_code = {}
+        self._holds = {}          # discountID -> {userID: redemptions held by open checkouts}
+        self._file_signature = None
+        self._unsaved = 0         # queued writes not yet on disk; skip reloads meanwhile
+        self._checked_at = 0.0
+        self.load_error = None    # why the file could not be read; nothing is saved until it can
+        self.reload(force=True)
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def reload(self, force=False):
+        """Re-read the discounts file if it changed since it was last read or written here."""
+        with self.lock:
+            self._checked_at = time.monotonic()
+            signature = self._signature()
+            if not force and (self._unsaved or signature == self._file_signature):
+                return False
+            try:
+                discounts = list(read_records(self.path, DiscountCodec()))
+            except FileNotFoundError:
+                discounts = []
+            except RecordFormatError as e:
+                # Corrupt or from a newer version: keep the cached catalogue and never
+                # overwrite the file, or every discount in it would be lost
+                if self.load_error is None:
+                    print(f"⚠️ Could not read discounts, so they will not be saved: {e}")
+                self.load_error = e
+                return False
+            self.load_error = None
+            self.discounts = discounts
+            self._by_id = {d.discountID: d for d in discounts}
+            self._by_code = {d.code: d for d in discounts if d.code}
+            self._file_signature = signature
+            return True
+
+    def _refresh(self):
+        if time.monotonic() - self._checked_at >= self.RELOAD_INTERVAL:
+            self.reload()
+
+    def get(self, discountID):
+        """Return the discount with this ID, or None."""
+        with self.lock:
+            self._refresh()
+            return self._by_id.get(discountID)
+
+    def find(self, code):
+        """Return the discount with this promo code (case-insensitive), or None."""
+        with self.lock:
+            self._refresh()
+            return self._by_code.get(code.strip().upper()) if code else None
+
+    def add_discount(self, discount):
+        """Add a discount and save; raises InvalidDiscountError for a duplicate ID or code."""
+        with self.lock:
+            self._refresh()
+            if self.load_error is not None:
+                raise InvalidDiscountError(f"The discounts file cannot be read: {self.load_error}")
+            if discount.discountID in self._by_id:
+                raise InvalidDiscountError(f"Discount ID {discount.discountID} already exists.")
+            if discount.code and discount.code in self._by_code:
+                raise InvalidDiscountError(f"Promo code {discount.code} is already in use.")
+            if not 0 < discount.percentage <= 100:
+                raise InvalidDiscountError("Percentage must be between 0 and 100.")
+            self.discounts.append(discount)
+            self._by_id[discount.discountID] = discount
+            if discount.code:
+                self._by_code[discount.code] = discount
+            return self.save_discounts()
+
+    def reserve(self, code, userID, today=None):
+        """
+        Hold one redemption of a promo code for a checkout and return the Discount.
+        Raises InvalidDiscountError if the code is unknown, outside its validity
+        window, or would go over its total or per-user cap counting open holds.
+        Follow with confirm() once paid or release() if the checkout is abandoned.
+        """
+        with self.lock:
+            discount = self.find(code)
+            if discount is None:
+                raise InvalidDiscountError("Unknown promo code.")
+            if not discount.is_valid_on(today or date.today()):
+                raise InvalidDiscountError(f"Promo code {discount.code} is not valid today.")
+            holds = self._holds.setdefault(discount.discountID, {})
+            if discount.max_uses is not None and discount.uses + sum(holds.values()) >= discount.max_uses:
+                raise InvalidDiscountError(f"Promo code {discount.code} has been used up.")
+            used = discount.redemptions.get(userID, 0) + holds.get(userID, 0)
+            if discount.per_user_limit is not None and used >= discount.per_user_limit:
+                raise InvalidDiscountError(f"You have already used promo code {discount.code}.")
+            holds[userID] = holds.get(userID, 0) + 1
+            return discount
+
+    def release(self, discount, userID):
+        """Drop a held redemption without using it."""
+        with self.lock:
+            holds = self._holds.get(discount.discountID, {})
+            if holds.get(userID, 0) > 1:
+                holds[userID] -= 1
+            else:
+                holds.pop(userID, None)
+
+    def confirm(self, discount, userID):
+        """Turn a held redemption into a recorded use and save the discounts."""
+        with self.lock:
+            self.release(discount, userID)
+            # Count against the cached object, which may have been reloaded meanwhile
+            discount = self._by_id.get(discount.discountID, discount)
+            discount.uses += 1
+            discount.redemptions[userID] = discount.redemptions.get(userID, 0) + 1
+            return self.save_discounts()
+
+    def save_discounts(self):
+        """
+        Save all discounts to the discounts file (through the persistence queue,
+        if any). Does nothing while the file cannot be read (see load_error).
+        """
+        with self.lock:
+            if self.load_error is not None:
+                print(f"⚠️ Discounts not saved: the file cannot be read ({self.load_error})")
+                return None
+            if self.persistence is None:
+                atomic_write(self.path, self._serialize())
+                self._file_signature = self._signature()
+                return None
+            self._unsaved += 1
+            return self.persistence.write(self.path, self._serialize, on_written=self._written)
+
+    def _serialize(self):
+        with self.lock:
+            return encode_records(DiscountCodec(), self.discounts)
+
+    def _written(self):
+        with self.lock:
+            self._unsaved -= 1
+            self._file_signature = self._signature()
+
+    def manage_discounts(self):
+        """Display a Tkinter window to add and save discounts."""
+        management_window = tk.Toplevel()
+        management_window.title("Discount Management")
+        management_window.geometry("450x420")
+        management_window.minsize(400, 420)
+        
+        content_frame = ttk.Frame(management_window, padding=20)
+        content_frame.pack(fill="both", expand=True)
+        
+        labels = ["Discount ID:", "Description:", "Percentage:", "Promo Code:",
+                  "Valid From (YYYY-MM-DD):", "Valid Until (YYYY-MM-DD):",
+                  "Max Uses (blank = unlimited):", "Uses Per Customer:"]
+        entries = []
+        for row, text in enumerate(labels):
+            ttk.Label(content_frame, text=text).grid(row=row, column=0, sticky="w", pady=5)
+            entry = ttk.Entry(content_frame, width=30)
+            entry.grid(row=row, column=1, sticky="ew", padx=5)
+            entries.append(entry)
+        id_entry, desc_entry, perc_entry, code_entry, from_entry, until_entry, uses_entry, per_user_entry = entries
+        
+        content_frame.columnconfigure(1, weight=1)
+
+        def optional_date(entry):
+            text = entry.get().strip()
+            return datetime.strptime(text, "%Y-%m-%d").date() if text else None
+
+        def optional_int(entry):
+            text = entry.get().strip()
+            return int(text) if text else None
+        
+        def add_discount():
+            """Add a new discount entry from the form input."""
+            try:
+                discount = Discount( 
+                    int(id_entry.get()),
+                    desc_entry.get(),
+                    float(perc_entry.get()),
+                    code=code_entry.get(),
+                    valid_from=optional_date(from_entry),
+                    valid_until=optional_date(until_entry),
+                    max_uses=optional_int(uses_entry),
+                    per_user_limit=optional_int(per_user_entry)
+                )
+                self.add_discount(discount)
+                messagebox.showinfo("Success", "Discount added successfully")
+                management_window.destroy()  # ✅ Close the window after success
+            except Exception as e:
+                messagebox.showerror("Error", f"Invalid discount data: {str(e)}")
+
+        btn_frame = ttk.Frame(content_frame)
+        btn_frame.grid(row=len(labels), column=0, columnspan=2, pady=15)
+        
+        ttk.Button(btn_frame, text="Add Discount", command=add_discount, width=20).pack()
+
+CardCheck = namedtuple("CardCheck", "valid reason")
+CARD_OK = CardCheck(True, None)
+
+class Payment:
+    """Handles user payment data and basic validation."""
+    CARD_NUMBER = re.compile(r'[0-9]{16}')  # ASCII only: \d also matches other scripts' digits
+    EXPIRY = re.compile(r'([0-9]{2})/([0-9]{2})')
+    LUHN_DOUBLED = (0, 2, 4, 6, 8, 1, 3, 5, 7, 9)  # digit -> digit*2 with digits summed
+    __slots__ = ("paymentID", "amount", "date", "method", "card_number", "expiry")
+
+    def __init__(self, paymentID, amount, method, card_number=None, expiry=None):
+        """Initialize payment with amount, method, and optional card info."""
+        self.paymentID = paymentID
+        self.amount = amount
+        self.date = datetime.now()
+        self.method = method
+        self.card_number = card_number
+        self.expiry = expiry
+
+    def process_payment(self):
+        """Return True if the payment is valid, otherwise False."""
+        if self.validate_card():
+            return True
+        return False
+
+    def validate_card(self):
+        """Validate credit card number (format and Luhn checksum) and expiry."""
+        if self.method == "Credit/Debit":
+            return Payment.check_card(self.card_number, self.expiry).valid
+        return True
+
+    @staticmethod
+    def card_number_problem(card_number):
+        """Return why a card number is invalid, or None if it is fine."""
+        if not card_number or not Payment.CARD_NUMBER.fullmatch(card_number):
+            return "Card number must be 16 digits."
+        # For 16 digits the Luhn doubling falls on every even index, so the
+        # checksum is the sum of eight precomputed two-digit pair values.
+        pairs = LUHN_PAIRS
+        n = card_number
+        total = (pairs[n[0:2]] + pairs[n[2:4]] + pairs[n[4:6]] + pairs[n[6:8]]
+                 + pairs[n[8:10]] + pairs[n[10:12]] + pairs[n[12:14]] + pairs[n[14:16]])
+        if total % 10:
+            return "Card number failed the checksum."
+        return None
+
+    @staticmethod
+    def expiry_problem(expiry, today):
+        """Return why an MM/YY expiry is invalid or in the past, or None if it is fine."""
+        match = Payment.EXPIRY.fullmatch(expiry) if expiry else None
+        if not match:
+            return "Expiry must be in MM/YY format."
+        month, year = int(match.group(1)), 2000 + int(match.group(2))
+        if not 1 <= month <= 12:
+            return "Expiry month must be between 01 and 12."
+        if (year, month) < (today.year, today.month):
+            return "Card has expired."
+        return None
+
+    @staticmethod
+    def check_card(card_number, expiry, today=None):
+        """Check one card and return a CardCheck(valid, reason); reason is None when valid."""
+        reason = (Payment.card_number_problem(card_number)
+                  or Payment.expiry_problem(expiry, today or date.today()))
+        return CARD_OK if reason is None else CardCheck(False, reason)
+
+    @staticmethod
+    def validate_cards(cards, today=None):
+        """
+        Validate many (card_number, expiry) pairs in one call, e.g. for bulk or
+        corporate orders. Returns a CardCheck for each pair, in the same order.
+        """
+        today = today or date.today()
+        number_problem = Payment.card_number_problem
+        expiry_problem = Payment.expiry_problem
+        expiries = {}  # few distinct MM/YY values per batch, so check each once
+        results = []
+        for number, expiry in cards:
+            reason = number_problem(number)
+            if reason is None:
+                if expiry not in expiries:
+                    expiries[expiry] = expiry_problem(expiry, today)
+                reason = expiries[expiry]
+            results.append(CARD_OK if reason is None else CardCheck(False, reason))
+        return results
+
+# Luhn contribution of a two-digit pair whose first digit is doubled
+LUHN_PAIRS = {f"{a}{b}": Payment.LUHN_DOUBLED[a] + b for a in range(10) for b in range(10)}
+
+class PaymentResult:
+    """Outcome of a charge: approved, declined or failed (gave up after retries)."""
+    APPROVED = "approved"
+    DECLINED = "declined"
+    FAILED = "failed"
+
+    def __init__(self, status, reference=None, message=""):
+        """Initialize a result with its status, gateway reference and message."""
+        self.status = status
+        self.reference = reference
+        self.message = message
+
+    @property
+    def approved(self):
+        return self.status == PaymentResult.APPROVED
+
+class PaymentGateway:
+    """Interface for payment providers used by PaymentProcessor."""
+
+    def charge(self, payment, idempotency_key, timeout):
+        """
+        Charge the payment and return a PaymentResult.
+        Calls repeated with the same idempotency key must return the original
+        result instead of charging again. Raise GatewayTimeoutError or
+        GatewayUnavailableError for failures that are safe to retry.
+        """
+        raise NotImplementedError
+
+class LocalPaymentGateway(PaymentGateway):
+    """Approves payments whose card details pass local validation."""
+
+    def charge(self, payment, idempotency_key, timeout):
+        if payment.process_payment():
+            return PaymentResult(PaymentResult.APPROVED, reference=idempotency_key)
+        return PaymentResult(PaymentResult.DECLINED, message="Card details are invalid.")
+
+class MockPaymentGateway(PaymentGateway):
+    """In-process gateway with configurable latency and failure rates for testing."""
+
+    def __init__(self, latency=0.3, jitter=0.1, failure_rate=0.0, timeout_rate=0.0,
+                 decline_rate=0.0, seed=None):
+        """
+        latency/jitter are in seconds. failure_rate is the share of calls that fail
+        before charging, timeout_rate the share that charge but never answer, and
+        decline_rate the share of valid cards that are declined anyway.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.timeout_rate = timeout_rate
+        self.decline_rate = decline_rate
+        self.charges = 0  # distinct approved charges, to spot double charging
+        self._rng = random.Random(seed)
+        self._results = {}  # idempotency key -> PaymentResult
+        self._lock = threading.Lock()
+
+    def charge(self, payment, idempotency_key, timeout):
+        with self._lock:
+            if idempotency_key in self._results:
+                return self._results[idempotency_key]
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            roll = self._rng.random()
+
+        if roll < self.failure_rate:
+            time.sleep(min(delay, timeout))
+            raise GatewayUnavailableError("Payment gateway temporarily unavailable.")
+        roll -= self.failure_rate
+
+        if not payment.process_payment():
+            result = PaymentResult(PaymentResult.DECLINED, message="Card details are invalid.")
+        elif roll < self.decline_rate:
+            result = PaymentResult(PaymentResult.DECLINED, message="Card declined by issuer.")
+        else:
+            result = PaymentResult(PaymentResult.APPROVED, reference=uuid.uuid4().hex)
+        roll -= self.decline_rate
+
+        # Record the outcome before answering, like a real gateway would, so a
+        # timed-out charge is found again when the caller retries with the same key.
+        with self._lock:
+            result = self._results.setdefault(idempotency_key, result)
+            if result.approved:
+                self.charges += 1
+
+        if roll < self.timeout_rate or delay > timeout:
+            time.sleep(timeout)
+            raise GatewayTimeoutError(f"No answer from payment gateway after {timeout:.1f}s.")
+        time.sleep(delay)
+        return result
+
+class PaymentJob:
+    """Handle for a submitted payment. Poll done()/status, wait(), or pass a callback."""
+
+    def __init__(self, payment, idempotency_key):
+        """Initialize a pending job for the payment and its idempotency key."""
+        self.payment = payment
+        self.idempotency_key = idempotency_key
+        self.attempts = 0
+        self.result = None
+        self._done = threading.Event()
+
+    @property
+    def status(self):
+        return self.result.status if self.result else "pending"
+
+    def done(self):
+        """Return True once the payment has a final result."""
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the payment finishes and return its PaymentResult (or None on timeout)."""
+        self._done.wait(timeout)
+        return self.result
+
+    def _finish(self, result):
+        self.result = result
+        self._done.set()
+
+class PaymentProcessor:
+    """
+    Runs gateway charges on a worker pool with per-attempt timeouts and retries.
+    Each gateway call runs on a separate pool so an attempt that overruns the
+    timeout is abandoned (and retried with the same idempotency key) instead of
+    holding up the job.
+    """
+
+    def __init__(self, gateway=None, workers=4, timeout=5.0, retries=2, backoff=0.25):
+        """Initialize the worker pool. retries is the number of extra attempts after the first."""
+        self.gateway = gateway or LocalPaymentGateway()
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="payment")
+        self._calls = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gateway")
+        self._jobs = {}  # idempotency key -> PaymentJob still in flight
+        self._lock = threading.Lock()
+
+    def submit(self, payment, idempotency_key=None, callback=None):
+        """
+        Queue a payment and return its PaymentJob without waiting for the gateway.
+        Submitting a key that is still in flight returns that job; once a job has
+        finished, the same key charges again, and the gateway returns the
+        original outcome if the earlier attempt went through.
+        The callback, if given, is called with the job from a worker thread.
+        """
+        key = idempotency_key or uuid.uuid4().hex
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                return job
+            job = self._jobs[key] = PaymentJob(payment, key)
+        self._pool.submit(self._run, job, callback)
+        return job
+
+    def _run(self, job, callback):
+        result = None
+        for attempt in range(self.retries + 1):
+            job.attempts = attempt + 1
+            call = self._calls.submit(self.gateway.charge, job.payment, job.idempotency_key, self.timeout)
+            try:
+                try:
+                    result = call.result(self.timeout)
+                except FuturesTimeoutError:
+                    call.cancel()  # if it has not started yet
+                    raise GatewayTimeoutError(f"No answer from payment gateway after {self.timeout:.1f}s.")
+                break
+            except (GatewayTimeoutError, GatewayUnavailableError) as e:
+                result = PaymentResult(PaymentResult.FAILED, message=str(e))
+                if attempt < self.retries:
+                    time.sleep(self.backoff * 2 ** attempt)
+            except Exception as e:
+                result = PaymentResult(PaymentResult.FAILED, message=f"Payment error: {e}")
+                break
+        with self._lock:
+            # Finished jobs are not kept: the payment holds the card details
+            if self._jobs.get(job.idempotency_key) is job:
+                del self._jobs[job.idempotency_key]
+        job.payment = None
+        job._finish(result)
+        if callback:
+            callback(job)
+
+    def shutdown(self, wait=True):
+        """Stop accepting payments and optionally wait for those in flight."""
+        self._pool.shutdown(wait=wait)
+        self._calls.shutdown(wait=wait)
+
+class PurchaseHistory:
+    """Tracks tickets purchased by a user, indexed by ticket ID, event and purchase date."""
+    __slots__ = ("ownerID", "_store", "_legacy", "_by_id", "_by_event", "_by_date")
+
+    def __init__(self, ownerID=None):
+        """Initialize an empty history for the given owner."""
+        # The indexes are only built when the history is first used, so the
+        # many users who are never looked at cost no more than this object
+        self.ownerID = ownerID
+        self._store = None
+        self._legacy = ()       # tickets that older pickles stored inside the user
+        self._by_id = None      # ticketID -> ticket, in purchase order
+        self._by_event = None   # eventID -> {ticketID: ticket}
+        self._by_date = None    # purchase date -> {ticketID: ticket}
+
+    def __getstate__(self):
+        # Tickets live in the TicketStore; a pickled user only keeps the owner ID
+        return {"ownerID": self.ownerID}
+
+    def __setstate__(self, state):
+        self.__init__(state.get("ownerID"))
+        self._legacy = state.get("tickets", ())
+
+    def attach(self, store, ownerID):
+        """Read this owner's tickets from the store, lazily on first use."""
+        self.ownerID = ownerID
+        self._store = store
+        self._by_id = None
+
+    def _load(self):
+        if self._by_id is None:
+            self._by_id, self._by_event, self._by_date = {}, {}, {}
+            if self._store is not None:
+                for ticket in self._store.for_owner(self.ownerID):
+                    self._index(ticket)
+
+    def _index(self, ticket):
+        self._by_id[ticket.ticketID] = ticket
+        if ticket.event:
+            self._by_event.setdefault(ticket.event.eventID, {})[ticket.ticketID] = ticket
+        self._by_date.setdefault(ticket.issueDate.date(), {})[ticket.ticketID] = ticket
+
+    @property
+    def tickets(self):
+        """All purchased tickets as a list (kept for older callers)."""
+        return self.get_history()
+
+    def __len__(self):
+        self._load()
+        return len(self._by_id)
+
+    def is_loaded(self):
+        """Return True if the tickets have been read from the store."""
+        return self._by_id is not None
+
+    def add_ticket(self, ticket):
+        """Add a ticket to the purchase history (and to the ticket store, if attached)."""
+        self._load()
+        ticket.ownerID = self.ownerID
+        self._index(ticket)
+        if self._store is not None:
+            self._store.add(ticket)
+
+    def remove_ticket(self, ticketID):
+        """Remove a ticket by ID in O(1) and return it, or None if it is not here."""
+        self._load()
+        ticket = self._by_id.pop(ticketID, None)
+        if ticket is None:
+            return None
+        if ticket.event:
+            self._by_event.get(ticket.event.eventID, {}).pop(ticketID, None)
+        self._by_date.get(ticket.issueDate.date(), {}).pop(ticketID, None)
+        if self._store is not None:
+            self._store.remove(ticketID)
+        return ticket
+
+    def get_ticket(self, ticketID):
+        """Return the ticket with this ID, or None."""
+        self._load()
+        return self._by_id.get(ticketID)
+
+    def get_history(self):
+        """Return all purchased tickets."""
+        self._load()
+        return list(self._by_id.values())
+
+    def by_event(self, eventID):
+        """Return the tickets bought for one event."""
+        self._load()
+        return list(self._by_event.get(eventID, {}).values())
+
+    def by_date(self, day):
+        """Return the tickets bought on a given date."""
+        self._load()
+        return list(self._by_date.get(day, {}).values())
+
+    def page_count(self, page_size, eventID=None):
+        """Return how many pages of page_size tickets there are (at least 1)."""
+        self._load()
+        count = len(self._by_id) if eventID is None else len(self._by_event.get(eventID, {}))
+        return max(1, -(-count // page_size))
+
+    def get_page(self, page, page_size, eventID=None):
+        """Return the tickets on a 0-based page, optionally limited to one event."""
+        self._load()
+        tickets = self._by_id if eventID is None else self._by_event.get(eventID, {})
+        start = page * page_size
+        return list(islice(tickets.values(), start, start + page_size))
+
+    def archived(self):
+        """
+        Return this owner's tickets for finished events that were moved to the
+        archive. They are read from the archive on each call, not indexed here.
+        """
+        archive = self._store.archive if self._store is not None else None
+        return archive.for_owner(self.ownerID) if archive is not None else []
+
+# -------------------- CREDENTIALS --------------------#
+# Passwords are stored as "pbkdf2_sha256$<iterations>$<salt>$<hash>" in the
+# user's password field. Hashing is deliberately slow, so the app runs it in a
+# process pool. Raising PASSWORD_ITERATIONS upgrades each account on its next
+# login; values without the prefix are plaintext from older versions.
+PASSWORD_SCHEME = "pbkdf2_sha256"
+PASSWORD_ITERATIONS = 600_000
+PASSWORD_SALT_BYTES = 16
+LoginResult = namedtuple("LoginResult", "user rehashed")
+
+def hash_password(password, iterations=PASSWORD_ITERATIONS, salt=None):
+    """Return a new salted hash of password in the stored format."""
+    salt = salt or os.urandom(PASSWORD_SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return "$".join((PASSWORD_SCHEME, str(iterations), base64.b64encode(salt).decode("ascii"),
+                     base64.b64encode(digest).decode("ascii")))
+
+def parse_password_hash(stored):
+    """Return (iterations, salt, digest) from a stored hash, or None if stored is plaintext."""
+    parts = stored.split("$")
+    if len(parts) != 4 or parts[0] != PASSWORD_SCHEME or not parts[1].isdigit():
+        return None
+    try:
+        return int(parts[1]), base64.b64decode(parts[2], validate=True), base64.b64decode(parts[3], validate=True)
+    except ValueError:
+        return None
+
+def verify_password(password, stored):
+    """Return True if password matches the stored hash (or legacy plaintext)."""
+    parsed = parse_password_hash(stored)
+    if parsed is None:
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+    iterations, salt, digest = parsed
+    return hmac.compare_digest(
+        hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations), digest)
+
+def needs_rehash(stored, iterations=PASSWORD_ITERATIONS):
+    """Return True if stored is plaintext or hashed with fewer iterations than wanted."""
+    parsed = parse_password_hash(stored)
+    return parsed is None or parsed[0] < iterations
+
+def check_password(password, stored, iterations=PASSWORD_ITERATIONS):
+    """
+    Verify a password and, if it matches but the stored value is outdated,
+    hash it again. Returns (matches, new hash or None). Runs in the worker
+    processes, so a login costs one round trip.
+    """
+    if not verify_password(password, stored):
+        return False, None
+    return True, hash_password(password, iterations) if needs_rehash(stored, iterations) else None
+
+class CredentialService:
+    """Hashes and checks passwords in worker processes so the GUI stays responsive."""
+
+    def __init__(self, workers=None, iterations=PASSWORD_ITERATIONS):
+        """Initialize with a worker count (default: one per CPU) and the hashing cost."""
+        self.workers = workers or os.cpu_count() or 1
+        self.iterations = iterations
+        self._pool = None
+        self._lock = threading.Lock()
+        # Checked when the email is unknown, so the reply takes as long as for a real account
+        self._decoy = "$".join((PASSWORD_SCHEME, str(iterations),
+                                base64.b64encode(os.urandom(PASSWORD_SALT_BYTES)).decode("ascii"),
+                                base64.b64encode(os.urandom(32)).decode("ascii")))
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                # spawn: forking a process that runs Tk and worker threads is unsafe
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def hash(self, password):
+        """Return a Future for the stored form of a new password."""
+        return self._executor().submit(hash_password, password, self.iterations)
+
+    def authenticate(self, users, email, password):
+        """
+        Return a Future for a LoginResult. The user is None if the email or
+        password is wrong. On success an outdated hash or plaintext password is
+        replaced on the user (rehashed is True), and the caller should save.
+        """
+        user = next((u for u in users if u.email == email), None)
+        stored = user.password if user is not None else self._decoy
+        result = Future()
+
+        def checked(future):
+            try:
+                matches, new_hash = future.result()
+            except Exception as e:
+                result.set_exception(e)
+                return
+            if not matches or user is None:
+                result.set_result(LoginResult(None, False))
+                return
+            rehashed = new_hash is not None and user.password == stored
+            if rehashed:
+                user.password = new_hash
+            result.set_result(LoginResult(user, rehashed))
+
+        self._executor().submit(check_password, password, stored, self.iterations).add_done_callback(checked)
+        return result
+
+    def migrate(self, users):
+        """Hash any plaintext passwords in place, using every worker. Returns how many changed."""
+        plain = [u for u in users if parse_password_hash(u.password) is None]
+        if plain:
+            hashes = self._executor().map(hash_password, [u.password for u in plain],
+                                          [self.iterations] * len(plain),
+                                          chunksize=max(1, len(plain) // (self.workers * 4)))
+            for user, hashed in zip(plain, hashes):
+                user.password = hashed
+        return len(plain)
+
+    def shutdown(self, wait=True):
+        """Stop the worker processes."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+# -------------------- SESSIONS --------------------#
+class Session:
+    """A logged-in user's session: who, when it started and when it was last used."""
+    __slots__ = ("userID", "created", "last_seen")
+
+    def __init__(self, userID, now):
+        self.userID = userID
+        self.created = now
+        self.last_seen = now
+
+class SessionManager:
+    """
+    Issues signed, opaque session tokens at login and maps them back to user IDs
+    in O(1). Sessions live in a bounded LRU cache and end after idle_timeout
+    seconds without use, after max_age seconds in total, or when revoked.
+    Tokens are "<session id>.<HMAC>"; forged tokens are rejected before the
+    cache is consulted. The key is per process, so sessions do not survive a
+    restart.
+    """
+
+    def __init__(self, max_sessions=100_000, idle_timeout=30 * 60, max_age=12 * 60 * 60,
+                 secret=None, clock=time.monotonic):
+        """Initialize with the cache bound, expiry times in seconds and an optional signing key."""
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_age = max_age
+        self.clock = clock
+        self._secret = secret or os.urandom(32)
+        self._sessions = OrderedDict()  # session ID -> Session, least recently used first
+        self._by_user = {}              # userID -> {session IDs}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _signature(self, session_id):
+        digest = hmac.new(self._secret, session_id.encode("ascii"), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest[:16]).decode("ascii").rstrip("=")
+
+    def _session_id(self, token):
+        session_id, _, signature = (token or "").partition(".")
+        if session_id and hmac.compare_digest(signature, self._signature(session_id)):
+            return session_id
+        return None
+
+    def issue(self, userID):
+        """Start a session for userID and return its token."""
+        session_id = base64.urlsafe_b64encode(os.urandom(16)).decode("ascii").rstrip("=")
+        with self._lock:
+            self._sessions[session_id] = Session(userID, self.clock())
+            self._by_user.setdefault(userID, set()).add(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._drop(next(iter(self._sessions)))
+        return f"{session_id}.{self._signature(session_id)}"
+
+    def resolve(self, token):
+        """Return the user ID of a live session and mark it as used, or None."""
+        session_id = self._session_id(token)
+        if session_id is None:
+            return None
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            now = self.clock()
+            if now - session.last_seen > self.idle_timeout or now - session.created > self.max_age:
+                self._drop(session_id)
+                return None
+            session.last_seen = now
+            self._sessions.move_to_end(session_id)
+            return session.userID
+
+    def revoke(self, token):
+        """End the session for a token. Returns True if it was live."""
+        session_id = self._session_id(token)
+        with self._lock:
+            return session_id is not None and self._drop(session_id)
+
+    def revoke_user(self, userID):
+        """End every session of a user. Returns how many there were."""
+        with self._lock:
+            session_ids = list(self._by_user.get(userID, ()))
+            for session_id in session_ids:
+                self._drop(session_id)
+            return len(session_ids)
+
+    def purge_expired(self):
+        """Drop sessions that have been idle too long. Returns how many were dropped."""
+        # The cache is in last-use order, so idle sessions are all at the front
+        dropped = 0
+        with self._lock:
+            cutoff = self.clock() - self.idle_timeout
+            while self._sessions:
+                session_id, session = next(iter(self._sessions.items()))
+                if session.last_seen >= cutoff:
+                    break
+                self._drop(session_id)
+                dropped += 1
+        return dropped
+
+    def _drop(self, session_id):
+        # Caller holds the lock
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        user_sessions = self._by_user.get(session.userID)
+        if user_sessions is not None:
+            user_sessions.discard(session_id)
+            if not user_sessions:
+                del self._by_user[session.userID]
+        return True
+
+# -------------------- RECORD FORMAT --------------------#
+# Data files are a header (magic, record kind, schema version), then any
+# file-level fields the codec keeps, followed by blocks of about BLOCK_TARGET bytes. Each block starts with its byte length and
+# record count and holds length-prefixed records, so files can be streamed a
+# block at a time. Only plain values are stored, so files can be read from
+# shared storage safely and classes can be renamed without breaking them.
+RECORD_MAGIC = b"GPRX"
+FILE_HEADER = struct.Struct("<4s4sH")
+BLOCK_HEADER = struct.Struct("<II")
+RECORD_LENGTH = struct.Struct("<I")
+BLOCK_TARGET = 1 << 16
+
+class RecordCodec:
+    """Converts one kind of object to and from record bytes. Subclasses set KIND and VERSION."""
+    KIND = b""
+    VERSION = 1
+
+    def file_fields(self):
+        """Return the file-level fields written after the file header (none by default)."""
+        return b""
+
+    def read_file_fields(self, f, path, version):
+        """Read the fields file_fields wrote into a file of the given schema version."""
+
+    def encode(self, obj):
+        """Return the record bytes for obj."""
+        raise NotImplementedError
+
+    def decode(self, buf, start, end, version):
+        """Build an object from buf[start:end], written with the given schema version."""
+        raise NotImplementedError
+
+    def decode_block(self, block, count, version):
+        """Decode the count records in a block; codecs for large files override this for speed."""
+        size = RECORD_LENGTH.size
+        unpack_length = RECORD_LENGTH.unpack_from
+        decode = self.decode
+        objects = []
+        offset = 0
+        for _ in range(count):
+            (length,) = unpack_length(block, offset)
+            offset += size
+            objects.append(decode(block, offset, offset + length, version))
+            offset += length
+        return objects
+
+class UserCodec(RecordCodec):
+    """
+    Record layout for User and Admin: ID, admin flag and the byte lengths of
+    name, email and password, followed by those three UTF-8 strings.
+    """
+    KIND = b"USER"
+    FIXED = struct.Struct("<IBHHH")
+
+    def encode(self, user):
+        name, email, password = (user.name.encode("utf-8"), user.email.encode("utf-8"),
+                                 user.password.encode("utf-8"))
+        return self.FIXED.pack(user.userID, isinstance(user, Admin),
+                               len(name), len(email), len(password)) + name + email + password
+
+    def decode_block(self, block, count, version):
+        size = RECORD_LENGTH.size + self.FIXED.size
+        unpack = struct.Struct("<I" + self.FIXED.format[1:]).unpack_from  # length + fixed part
+        new = object.__new__
+        users = []
+        offset = 0
+        for _ in range(count):
+            length, userID, is_admin, name_len, email_len, password_len = unpack(block, offset)
+            name_at = offset + size
+            email_at = name_at + name_len
+            password_at = email_at + email_len
+            offset += RECORD_LENGTH.size + length
+            user = new(Admin if is_admin else User)
+            user.userID = userID
+            user.name = str(block[name_at:email_at], "utf-8")
+            user.email = str(block[email_at:password_at], "utf-8")
+            user.password = str(block[password_at:offset], "utf-8")
+            user.purchase_history = PurchaseHistory(userID)
+            users.append(user)
+        return users
+
+class TicketCodec(RecordCodec):
+    """
+    Record layout for tickets: type, ID, price, issue time, event ID, owner ID,
+    and the seat as row and number (venue seat IDs are always "row-number").
+    Every record has the same size, so a block decodes with one iter_unpack.
+    Decoded tickets point at the live seats of the given events. From v2 the
+    file header also holds the next ticket ID to hand out, so the IDs of
+    cancelled tickets are never given out again.
+    """
+    KIND = b"TCKT"
+    VERSION = 2
+    FIXED = struct.Struct("<BIdqIIHH")
+    NEXT_ID = struct.Struct("<I")
+    TYPES = (Ticket, SingleRacePass, WeekendPackage, SeasonMembership, GroupDiscount)
+
+    def __init__(self, events=None, next_id=0):
+        """
+        Initialize with the events (a dict by ID or a list) that decoded tickets
+        belong to. next_id is written to the header; reading a file replaces it.
+        """
+        if events is not None and not isinstance(events, dict):
+            events = {event.eventID: event for event in events}
+        self.events = events or {}
+        self.next_id = next_id
+        self._type_codes = {cls: code for code, cls in enumerate(self.TYPES)}
+        self._record = struct.Struct("<I" + self.FIXED.format[1:])  # length prefix + record
+        # Prices and owner IDs repeat across many tickets; decoded tickets share one object each
+        self._prices = {}
+        self._owners = {}
+
+    def encode(self, ticket):
+        event_id = ticket.event.eventID if ticket.event else 0
+        row = number = 0
+        if ticket.seat:
+            row_text, _, number_text = ticket.seat.seatID.partition("-")
+            if row_text.isdigit() and number_text.isdigit():
+                row, number = int(row_text), int(number_text)
+        return self.FIXED.pack(self._type_codes[type(ticket)], ticket.ticketID, ticket.price,
+                               ticket.issued_us, event_id, ticket.ownerID or 0, row, number)
+
+    def file_fields(self):
+        return self.NEXT_ID.pack(self.next_id)
+
+    def read_file_fields(self, f, path, version):
+        if version < 2:
+            return  # v1 files did not record it; IDs continue after the highest stored one
+        data = f.read(self.NEXT_ID.size)
+        if len(data) < self.NEXT_ID.size:
+            raise RecordFormatError(f"{path} is too short to be a record file.")
+        (self.next_id,) = self.NEXT_ID.unpack(data)
+
+    def decode_block(self, block, count, version):
+        # The hot loop when loading the ticket file, so everything is a local
+        if len(block) != count * self._record.size:
+            raise RecordFormatError("Ticket block has records of the wrong size.")
+        types = self.TYPES
+        if any(code >= len(types) for code in block[RECORD_LENGTH.size::self._record.size]):
+            raise RecordFormatError("Ticket block has a record of an unknown ticket type.")
+        venues = {}  # eventID -> (event, seat grid, rows, seats per row)
+        new = object.__new__
+        prices = self._prices.setdefault
+        owners = self._owners.setdefault
+        tickets = []
+        append = tickets.append
+        for _, code, ticketID, price, issued_us, eventID, ownerID, row, number in self._record.iter_unpack(block):
+            venue = venues.get(eventID)
+            if venue is None:
+                venue = venues[eventID] = self._venue(eventID)
+            ticket = new(types[code])
+            ticket.ticketID = ticketID
+            ticket.price = prices(price, price)
+            ticket.issued_us = issued_us
+            ticket.event, seats, rows, per_row = venue
+            if seats and 0 < row <= rows and 0 < number <= per_row:
+                ticket.seat = seats[row - 1][number - 1]
+            else:
+                # Not a seat of a catalogue venue: keep it detached (check reports it)
+                ticket.seat = Seat(f"{row}-{number}") if row else None
+            ticket.ownerID = owners(ownerID, ownerID) if ownerID else None
+            append(ticket)
+        return tickets
+
+    def _venue(self, eventID):
+        event = self.events.get(eventID)
+        if event is not None:
+            return event, event.venue.seats, event.venue.rows, event.venue.seats_per_row
+        # Not in the catalogue: keep the IDs, with seats detached from any venue
+        return Event(eventID, f"Event {eventID}", None, None), None, 0, 0
+
+class DiscountCodec(RecordCodec):
+    """
+    Record layout for discounts. v2: ID, percentage, validity dates as day
+    ordinals, usage caps, use count, the byte lengths of code and description
+    and the number of per-user redemption counts, followed by the code, the
+    description and (userID, count) pairs. Zero stands for "none" in the date
+    and cap fields. v1 records held only ID, percentage and description.
+    """
+    KIND = b"DISC"
+    VERSION = 2
+    FIXED = struct.Struct("<IdiiIIIHHI")
+    FIXED_V1 = struct.Struct("<Id")
+    REDEMPTION = struct.Struct("<II")
+
+    def encode(self, discount):
+        code = (discount.code or "").encode("utf-8")
+        description = discount.description.encode("utf-8")
+        return b"".join([
+            self.FIXED.pack(discount.discountID, discount.percentage,
+                            discount.valid_from.toordinal() if discount.valid_from else 0,
+                            discount.valid_until.toordinal() if discount.valid_until else 0,
+                            discount.max_uses or 0, discount.per_user_limit or 0, discount.uses,
+                            len(code), len(description), len(discount.redemptions)),
+            code, description,
+        ] + [self.REDEMPTION.pack(userID, count) for userID, count in discount.redemptions.items()])
+
+    def decode(self, buf, start, end, version):
+        if version == 1:
+            discountID, percentage = self.FIXED_V1.unpack_from(buf, start)
+            return Discount(discountID, str(buf[start + self.FIXED_V1.size:end], "utf-8"), percentage)
+
+        (discountID, percentage, valid_from, valid_until, max_uses, per_user_limit, uses,
+         code_len, description_len, redemption_count) = self.FIXED.unpack_from(buf, start)
+        code_at = start + self.FIXED.size
+        description_at = code_at + code_len
+        pairs_at = description_at + description_len
+        discount = Discount(discountID, str(buf[description_at:pairs_at], "utf-8"), percentage,
+                            code=str(buf[code_at:description_at], "utf-8") or None,
+                            valid_from=date.fromordinal(valid_from) if valid_from else None,
+                            valid_until=date.fromordinal(valid_until) if valid_until else None,
+                            max_uses=max_uses or None, per_user_limit=per_user_limit or None)
+        discount.uses = uses
+        discount.redemptions = dict(self.REDEMPTION.iter_unpack(
+            buf[pairs_at:pairs_at + redemption_count * self.REDEMPTION.size]))
+        return discount
+
+class WaitlistCodec(RecordCodec):
+    """Record layout for waitlist entries: event ID, user ID, ticket type, priority and join time."""
+    KIND = b"WAIT"
+    FIXED = struct.Struct("<IIBBq")
+
+    def encode(self, entry):
+        return self.FIXED.pack(entry.eventID, entry.userID, TicketCodec.TYPES.index(entry.ticket_type),
+                               entry.priority, entry.joined_us)
+
+    def decode(self, buf, start, end, version):
+        eventID, userID, type_code, priority, joined_us = self.FIXED.unpack_from(buf, start)
+        return WaitlistEntry(eventID, userID, TicketCodec.TYPES[type_code], priority, joined_us)
+
+class ArchiveIndexCodec(RecordCodec):
+    """
+    Record layout for archive index entries: event ID, event date as a day
+    ordinal (0 if unknown), segment generation, ticket count, first and last
+    ticket ID, face value, the owner filter's bit and hash counts and the byte
+    length of the event name, followed by the name and the filter's bits.
+    """
+    KIND = b"ARCH"
+    FIXED = struct.Struct("<IiIIIIdIBH")
+
+    def encode(self, entry):
+        name = entry.name.encode("utf-8")
+        return self.FIXED.pack(entry.eventID, entry.date.toordinal() if entry.date else 0, entry.generation,
+                               entry.tickets, entry.first_id, entry.last_id, entry.value,
+                               entry.owners.size, entry.owners.hashes, len(name)) + name + bytes(entry.owners.bits)
+
+    def decode(self, buf, start, end, version):
+        (eventID, day, generation, tickets, first_id, last_id, value,
+         bloom_size, bloom_hashes, name_len) = self.FIXED.unpack_from(buf, start)
+        name_at = start + self.FIXED.size
+        owners = BloomFilter.from_bits(bloom_size, bloom_hashes, buf[name_at + name_len:end])
+        return ArchivedEvent(eventID, str(buf[name_at:name_at + name_len], "utf-8"),
+                             date.fromordinal(day) if day else None, generation, tickets,
+                             first_id, last_id, value, owners)
+
+def encode_records(codec, objects):
+    """Return the bytes of a complete record file holding objects."""
+    length = RECORD_LENGTH.pack
+    encode = codec.encode
+    parts = [FILE_HEADER.pack(RECORD_MAGIC, codec.KIND, codec.VERSION), codec.file_fields()]
+    block, block_size = [], 0
+
+    def flush():
+        parts.append(BLOCK_HEADER.pack(block_size, len(block) // 2))
+        parts.extend(block)
+
+    for obj in objects:
+        record = encode(obj)
+        block.append(length(len(record)))
+        block.append(record)
+        block_size += RECORD_LENGTH.size + len(record)
+        if block_size >= BLOCK_TARGET:
+            flush()
+            block, block_size = [], 0
+    if block:
+        flush()
+    return b"".join(parts)
+
+def _read_header(f, path, codec):
+    header = f.read(FILE_HEADER.size)
+    if len(header) < FILE_HEADER.size:
+        raise RecordFormatError(f"{path} is too short to be a record file.")
+    magic, kind, version = FILE_HEADER.unpack(header)
+    if magic != RECORD_MAGIC or (codec is not None and kind != codec.KIND):
+        raise RecordFormatError(f"{path} is not a {codec.KIND.decode() if codec else 'record'} file.")
+    if codec is not None and version > codec.VERSION:
+        raise RecordFormatError(f"{path} uses schema v{version}; this version reads up to v{codec.VERSION}.")
+    if codec is not None:
+        codec.read_file_fields(f, path, version)
+    return version
+
+def _iter_blocks(f, path):
+    # Yield (block bytes, record count) for each block
+    while True:
+        header = f.read(BLOCK_HEADER.size)
+        if not header:
+            return
+        if len(header) < BLOCK_HEADER.size:
+            raise RecordFormatError(f"{path} ends with a truncated block.")
+        size, count = BLOCK_HEADER.unpack(header)
+        block = f.read(size)
+        if len(block) < size:
+            raise RecordFormatError(f"{path} ends with a truncated block.")
+        yield block, count
+
+def read_records(path, codec):
+    """Stream the objects stored in a record file, one block at a time."""
+    with open(path, 'rb') as f:
+        yield from _decode_stream(f, path, codec)
+
+def decode_records(data, path, codec):
+    """Stream the objects of a record file that is already in memory (path is for messages)."""
+    return _decode_stream(io.BytesIO(data), path, codec)
+
+def _decode_stream(f, path, codec):
+    version = _read_header(f, path, codec)
+    for block, count in _iter_blocks(f, path):
+        yield from codec.decode_block(block, count, version)
+
+class LegacyUnpickler(pickle.Unpickler):
+    """Reads the old .pkl data files, refusing anything but the project's own classes."""
+    ALLOWED = {"User", "Admin", "PurchaseHistory", "Ticket", "SingleRacePass", "WeekendPackage",
+               "SeasonMembership", "GroupDiscount", "Event", "Venue", "Seat", "Discount"}
+
+    def find_class(self, module, name):
+        if module in ("__main__", "main", __name__) and name in self.ALLOWED:
+            return globals()[name]
+        if module == "datetime" and name in ("date", "datetime"):
+            return {"date": date, "datetime": datetime}[name]
+        raise pickle.UnpicklingError(f"Refusing to load {module}.{name} from a data file.")
+
+def load_legacy_pickle(path):
+    """Load a list from an old .pkl file, or [] if it is missing or empty."""
+    try:
+        with open(path, 'rb') as f:
+            return LegacyUnpickler(f).load()
+    except (FileNotFoundError, EOFError):
+        return []
+
+def convert_legacy_files(directory=".", events=None):
+    """
+    Convert users.pkl, tickets.pkl and discounts.pkl in directory into the
+    record files, moving tickets out of users' inline histories on the way and
+    dropping cancelled tickets (those in no user's history).
+    The .pkl files are left in place. Returns (users, tickets, discounts) counts.
+    """
+    def path(name):
+        return os.path.join(directory, name)
+
+    users = load_legacy_pickle(path('users.pkl'))
+    discounts = load_legacy_pickle(path('discounts.pkl'))
+    store = TicketStore(events or default_events(), path=path(TICKETS_FILE))
+    store.load_tickets(load_legacy_pickle(path('tickets.pkl')), users)
+    # Older versions cancelled a ticket by taking it out of its owner's history
+    # only, so tickets no history holds were cancelled and are not carried over
+    for ticket in store.all():
+        if ticket.ownerID is None:
+            store.remove(ticket.ticketID)
+            if ticket.seat is not None:
+                ticket.seat.is_reserved = False
+
+    atomic_write(path(TICKETS_FILE), store._serialize())
+    atomic_write(path(DISCOUNTS_FILE), encode_records(DiscountCodec(), discounts))
+    atomic_write(path(USERS_FILE), encode_records(UserCodec(), users))
+    return len(users), len(store), len(discounts)
+
+# -------------------- PERSISTENCE --------------------#
+def atomic_write(path, data):
+    """
+    Write bytes to path through a temp file that is fsynced and renamed over
+    the target, so a crash leaves either the old file or the new one, never a
+    truncated mix.
+    """
+    temp_path = write_temp(path, data)
+    try:
+        os.replace(temp_path, path)
+    except BaseException:
+        discard_temp(temp_path)
+        raise
+    fsync_directory(os.path.dirname(os.path.abspath(path)))
+
+def write_temp(path, data):
+    """Write bytes to a new fsynced temp file next to path and return its name."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        discard_temp(temp_path)
+        raise
+    return temp_path
+
+def discard_temp(temp_path):
+    """Remove a temp file left by a failed write."""
+    try:
+        os.unlink(temp_path)
+    except OSError:
+        pass
+
+def fsync_directory(directory):
+    """Make renames in a directory durable (not supported on Windows)."""
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+class PendingCommit:
+    """Completion handle for writes queued on a PersistenceQueue."""
+
+    def __init__(self):
+        """Initialize an unfinished commit."""
+        self.error = None
+        self._done = threading.Event()
+
+    def done(self):
+        """Return True once the writes are on disk (or have failed)."""
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the writes are durable. Re-raises the error if they failed."""
+        if not self._done.wait(timeout):
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
+
+    def _finish(self, error=None):
+        self.error = error
+        self._done.set()
+
+class WriteBatch:
+    """Files touched by one logical change, committed together when the batch ends."""
+
+    def __init__(self):
+        """Initialize an empty batch."""
+        self.writes = {}  # path -> serializer
+        self.hooks = []   # called after the commit is written
+        self.commit = None
+
+class PersistenceQueue:
+    """
+    Write-behind queue for the data files. Writes are queued as (path, serializer)
+    pairs and a background thread commits them: every file changed since the
+    last commit is serialized and atomically written once, and commits that
+    arrive within group_window seconds of each other share one round of fsyncs.
+    """
+
+    def __init__(self, group_window=0.005):
+        """Initialize the queue; the writer thread starts on first use."""
+        self.group_window = group_window
+        self.lock = threading.RLock()  # held while data changes and while it is serialized
+        self._replace_lock = threading.Lock()  # held while a commit renames its files into place
+        self.commits = 0               # durable commits made
+        self.files_written = 0         # files written across all commits
+        self._pending = {}             # path -> serializer, latest wins
+        self._waiters = []             # PendingCommit handles resolved by the next commit
+        self._hooks = []               # on_written callbacks for the next commit
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._thread = None
+        self._closed = False
+
+    @contextmanager
+    def batch(self):
+        """
+        Group every write made inside the block into a single commit, e.g. all
+        tickets, users and discounts changed by one booking. The data lock is held
+        for the block so the writer never serializes a half-applied change.
+        Nested batches join the outermost one. The batch's commit handle is set
+        when the block exits. If the block raises, its writes are discarded
+        rather than committing a half-applied change.
+        """
+        current = getattr(self._local, "batch", None)
+        if current is not None:
+            yield current
+            return
+        batch = self._local.batch = WriteBatch()
+        try:
+            with self.lock:
+                yield batch
+        except BaseException as e:
+            batch.commit = PendingCommit()
+            batch.commit._finish(e)
+            raise
+        else:
+            batch.commit = self.submit(batch.writes, batch.hooks)
+        finally:
+            self._local.batch = None
+
+    def write(self, path, serializer, on_written=None):
+        """
+        Queue a write of serializer() to path. Inside a batch it joins the batch;
+        otherwise it is committed on its own. on_written, if given, is called on
+        the writer thread once the commit holding this write has finished.
+        Returns the PendingCommit, or None when the write joined a batch that has
+        not finished yet.
+        """
+        hooks = [on_written] if on_written else []
+        current = getattr(self._local, "batch", None)
+        if current is not None:
+            current.writes[path] = serializer
+            current.hooks.extend(hooks)
+            return None
+        return self.submit({path: serializer}, hooks)
+
+    def submit(self, writes, hooks=()):
+        """Queue a {path: serializer} mapping for the next commit and return its PendingCommit."""
+        commit = PendingCommit()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Persistence queue is closed.")
+            self._pending.update(writes)
+            self._hooks.extend(hooks)
+            self._waiters.append(commit)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="persistence", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return commit
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is on disk."""
+        return self.submit({}).wait(timeout)
+
+    def snapshot(self, paths=DATA_FILES, flush=False):
+        """
+        Return a Snapshot of the data files as of the last commit (after first
+        writing out anything queued, with flush=True). Taking it costs one hard
+        link per file whatever their size, and writers are only held up while
+        the links are made.
+        """
+        if flush:
+            self.flush()
+        paths = list(paths)
+        directory = tempfile.mkdtemp(prefix=".snapshot-", dir=os.path.dirname(os.path.abspath(paths[0])))
+        files = {}
+        try:
+            with self._replace_lock:
+                for number, path in enumerate(paths):
+                    copy = os.path.join(directory, f"{number}-{os.path.basename(path)}")
+                    try:
+                        os.link(path, copy)
+                    except FileNotFoundError:
+                        continue
+                    except OSError:
+                        shutil.copyfile(path, copy)  # no hard links here (e.g. another filesystem)
+                    files[path] = copy
+                version = self.commits
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        return Snapshot(directory, files, version)
+
+    def close(self):
+        """Write out everything still queued and stop the writer thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._waiters and not self._closed:
+                    self._cond.wait()
+                if not self._waiters:
+                    return
+            # Let concurrent bookings join this commit
+            if self.group_window and not self._closed:
+                time.sleep(self.group_window)
+            with self._cond:
+                writes, waiters, hooks = self._pending, self._waiters, self._hooks
+                self._pending, self._waiters, self._hooks = {}, [], []
+            error = None
+            try:
+                with self.lock:
+                    payloads = [(path, serializer()) for path, serializer in writes.items()]
+                # Write every file of the commit, then rename them all at once, so
+                # a snapshot sees either all of this commit or none of it
+                temps = []
+                try:
+                    for path, data in payloads:
+                        temps.append((path, write_temp(path, data)))
+                    with self._replace_lock:
+                        for path, temp_path in temps:
+                            os.replace(temp_path, path)
+                        self.commits += 1
+                except BaseException:
+                    for _, temp_path in temps:
+                        discard_temp(temp_path)
+                    raise
+                for directory in {os.path.dirname(os.path.abspath(path)) for path, _ in temps}:
+                    fsync_directory(directory)
+                self.files_written += len(payloads)
+            except Exception as e:
+                print(f"❌ Failed to write data files: {e}")
+                error = e
+            for hook in hooks:
+                try:
+                    hook()
+                except Exception as e:  # a failing hook must not stop the writer thread
+                    print(f"❌ A write hook failed: {e}")
+            for commit in waiters:
+                commit._finish(error)
+
+class Snapshot:
+    """
+    A read-only, point-in-time view of the data files for reports and backups.
+    Commits replace files by renaming new ones over them and never modify a
+    file in place, so the file versions a snapshot links to stay unchanged
+    while writers carry on. Close it (or use it in a with block) when done.
+    """
+
+    def __init__(self, directory, files, version):
+        """Initialize from the snapshot directory, {data path: snapshot copy} and commit count."""
+        self.directory = directory
+        self.files = files
+        self.version = version
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def path(self, path):
+        """Return where the snapshot's copy of a data file is; raises KeyError if it had none."""
+        return self.files[path]
+
+    def read(self, path, codec):
+        """Stream the records of one data file as of the snapshot."""
+        if path not in self.files:
+            return iter(())
+        return read_records(self.files[path], codec)
+
+    def backup(self, destination):
+        """Copy the snapshot's files into a destination directory, each written atomically."""
+        os.makedirs(destination, exist_ok=True)
+        for path, copy in self.files.items():
+            target = os.path.join(destination, os.path.basename(path))
+            with open(copy, 'rb') as f:
+                atomic_write(target, f.read())
+        return [os.path.join(destination, os.path.basename(path)) for path in self.files]
+
+    def close(self):
+        """Delete the snapshot's links; the live files are not affected."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+def sales_report(snapshot, archive=None):
+    """
+    Return (tickets sold, {eventID: seats sold}) from a snapshot's ticket file,
+    plus the archived events' counts from the archive index if one is given.
+    """
+    sold = {}
+    total = 0
+    for ticket in snapshot.read(TICKETS_FILE, TicketCodec()):
+        if is_sold(ticket):
+            total += 1
+            sold[ticket.event.eventID] = sold.get(ticket.event.eventID, 0) + 1
+    if archive is not None:
+        for entry in archive.entries():
+            total += entry.tickets
+            sold[entry.eventID] = sold.get(entry.eventID, 0) + entry.tickets
+    return total, sold
+
+def is_sold(ticket):
+    """
+    Return True if a ticket counts as sold: it has an owner and a seat. Reports,
+    checks and the archive all use this; compact drops tickets that fail it.
+    """
+    return ticket.ownerID is not None and ticket.seat is not None
+
+def face_value(ticket):
+    """Return a ticket's list price after its type discount (promo codes are not stored)."""
+    if isinstance(ticket, GroupDiscount):
+        return ticket.price  # the group size is not stored with the ticket
+    return ticket.calculate_price()
+
+class TicketStore:
+    """All sold tickets, persisted in the ticket file and indexed by ticket ID and owner."""
+
+    def __init__(self, events, path=TICKETS_FILE, persistence=None, archive=None):
+        """
+        Initialize the store for the given events; call load() before use.
+        Saves go through the persistence queue if one is given, otherwise they
+        are written straight away. The archive, if given, holds the tickets of
+        finished events that have been moved out of the store.
+        """
+        self.path = path
+        self.persistence = persistence
+        self.archive = archive
+        self.events = {event.eventID: event for event in events}
+        self._tickets = {}      # ticketID -> ticket
+        self._by_owner = {}     # ownerID -> {ticketID: ticket}
+        self._next_id = 1
+        self._lock = threading.RLock()  # bookings may come from several threads
+
+    def load(self, users=()):
+        """
+        Stream the ticket file, bind tickets to the live event seats and re-reserve
+        them, then attach each user's purchase history to the store.
+        """
+        codec = TicketCodec(self.events)
+        try:
+            stored = list(read_records(self.path, codec))
+        except FileNotFoundError:
+            stored = []
+        return self.load_tickets(stored, users, codec.next_id)
+
+    def load_tickets(self, stored, users=(), next_id=0):
+        """
+        Index a list of tickets and attach the users' purchase histories.
+        Tickets that older versions kept inside each user's pickle are moved into
+        the store, and duplicate ticket IDs from older versions are renumbered.
+        New IDs start at next_id (the ticket file's high-water mark) or after
+        the highest stored or archived ID, whichever is greater.
+        Returns True if the data was migrated and should be saved again.
+        """
+        # The same ticket was pickled both here and in its owner's history,
+        # so match the copies on event, seat and issue time.
+        by_key = {self._legacy_key(t): t for t in stored}
+        migrated = False
+        for user in users:
+            history = user.purchase_history
+            for ticket in history._legacy:
+                stored_ticket = by_key.get(self._legacy_key(ticket))
+                if stored_ticket is None:
+                    stored.append(ticket)
+                    stored_ticket = ticket
+                stored_ticket.ownerID = user.userID
+                migrated = True
+            history._legacy = ()
+            history.attach(self, user.userID)
+
+        if self.archive is not None:  # archived tickets keep their IDs, so new ones start after them
+            next_id = max([next_id] + [entry.last_id + 1 for entry in self.archive.entries()])
+        self._next_id = max(next_id, max((t.ticketID for t in stored), default=0) + 1)
+        for ticket in stored:
+            if ticket.ticketID in self._tickets:
+                ticket.ticketID = self.next_ticket_id()
+                migrated = True
+            self._bind(ticket)
+            self._index(ticket)
+        return migrated
+
+    @staticmethod
+    def _legacy_key(ticket):
+        return (ticket.event and ticket.event.eventID, ticket.seat and ticket.seat.seatID, ticket.issued_us)
+
+    def _bind(self, ticket):
+        # Point the ticket at the live seat so cancelling it frees the real seat
+        event = self.events.get(ticket.event.eventID) if ticket.event else None
+        if event is None:
+            return
+        if ticket.event is event:
+            seat = ticket.seat  # decoded straight onto the live seat
+        else:
+            seat = event.venue.get_seat(ticket.seat.seatID) if ticket.seat else None
+        ticket.event = event
+        if seat is not None:
+            ticket.seat = seat
+            if ticket.ownerID is not None:
+                seat.is_reserved = True
+
+    def _index(self, ticket):
+        self._tickets[ticket.ticketID] = ticket
+        self._by_owner.setdefault(ticket.ownerID, {})[ticket.ticketID] = ticket
+
+    def __len__(self):
+        return len(self._tickets)
+
+    def next_ticket_id(self):
+        """Allocate and return the next unused ticket ID."""
+        with self._lock:
+            ticket_id = self._next_id
+            self._next_id += 1
+            return ticket_id
+
+    def get(self, ticketID):
+        """Return the ticket with this ID, or None."""
+        return self._tickets.get(ticketID)
+
+    def all(self):
+        """Return every stored ticket."""
+        return list(self._tickets.values())
+
+    def for_owner(self, ownerID):
+        """Return the tickets owned by one user."""
+        return list(self._by_owner.get(ownerID, {}).values())
+
+    def add(self, ticket):
+        """Add a ticket (adding the same ticket twice is a no-op)."""
+        with self._lock:
+            current = self._tickets.get(ticket.ticketID)
+            if current is ticket:
+                return
+            if current is not None:
+                self.remove(ticket.ticketID)
+            self._index(ticket)
+            self._next_id = max(self._next_id, ticket.ticketID + 1)
+
+    def remove(self, ticketID):
+        """Remove a ticket by ID in O(1) and return it, or None."""
+        with self._lock:
+            ticket = self._tickets.pop(ticketID, None)
+            if ticket is not None:
+                self._by_owner.get(ticket.ownerID, {}).pop(ticketID, None)
+            return ticket
+
+    def save(self):
+        """Queue a write of all tickets to the ticket file and return its PendingCommit."""
+        if self.persistence is None:
+            atomic_write(self.path, self._serialize())
+            return None
+        return self.persistence.write(self.path, self._serialize)
+
+    def _serialize(self):
+        return encode_records(TicketCodec(next_id=self._next_id), self._tickets.values())
+
+# -------------------- GATE ENTRY --------------------#
+# Tickets carry a signed entry code that gate scanners check without touching
+# the ticket file. Online gates share a GateIndex per event (O(1) lookups of
+# valid and used tickets, with an append-only log of scans). Offline scanners
+# load a GateSnapshot: a Bloom filter of the valid tickets (ID and seat) plus
+# the IDs already used, and keep their own scan log to merge back later.
+GATE_KEY_FILE = 'gate.key'
+GATE_SNAPSHOT_MAGIC = b"GPG2"  # GPGS snapshots keyed the filter by ticket ID alone
+
+def load_gate_key(path=GATE_KEY_FILE):
+    """Return the key that signs ticket codes, creating it on first use."""
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        key = os.urandom(32)
+        atomic_write(path, key)
+        return key
+
+class TicketCodeSigner:
+    """
+    Makes and checks ticket entry codes: ticket ID, event ID and seat (row and
+    number) followed by a truncated HMAC-SHA256, as 32 base32 characters.
+    """
+    PAYLOAD = struct.Struct("<IIHH")
+    SIGNATURE_BYTES = 8
+
+    def __init__(self, key):
+        """Initialize with the signing key shared by the box office and the scanners."""
+        self.key = key
+
+    def _signature(self, payload):
+        return hmac.new(self.key, payload, hashlib.sha256).digest()[:self.SIGNATURE_BYTES]
+
+    @staticmethod
+    def _seat_numbers(seatID):
+        row_text, _, number_text = (seatID or "").partition("-")
+        if row_text.isdigit() and number_text.isdigit():
+            return int(row_text), int(number_text)
+        return 0, 0
+
+    def code_for(self, ticket):
+        """Return the entry code for a ticket."""
+        row, number = self._seat_numbers(ticket.seat.seatID if ticket.seat else None)
+        payload = self.PAYLOAD.pack(ticket.ticketID, ticket.event.eventID if ticket.event else 0, row, number)
+        return base64.b32encode(payload + self._signature(payload)).decode("ascii")
+
+    def seat_of(self, ticket):
+        """Return the seat ID a ticket's code carries (None for an unseated ticket)."""
+        row, number = self._seat_numbers(ticket.seat.seatID if ticket.seat else None)
+        return f"{row}-{number}" if row else None
+
+    @classmethod
+    def entry_key(cls, ticketID, seatID):
+        """Return a ticket ID and seat packed into one integer, for Bloom filters."""
+        row, number = cls._seat_numbers(seatID)
+        return ticketID | row << 32 | number << 48
+
+    def parse(self, code):
+        """Return (ticketID, eventID, seatID) for a genuine code, or None."""
+        try:
+            raw = base64.b32decode(code.strip().upper())
+        except (ValueError, AttributeError):
+            return None
+        if len(raw) != self.PAYLOAD.size + self.SIGNATURE_BYTES:
+            return None
+        payload, signature = raw[:self.PAYLOAD.size], raw[self.PAYLOAD.size:]
+        if not hmac.compare_digest(signature, self._signature(payload)):
+            return None
+        ticketID, eventID, row, number = self.PAYLOAD.unpack(payload)
+        return ticketID, eventID, f"{row}-{number}" if row else None
+
+class ScanResult:
+    """Outcome of a gate scan. scanned_at is the first scan time for double entries."""
+    __slots__ = ("status", "ticketID", "seatID", "scanned_at")
+    ADMITTED = "admitted"
+    ALREADY_USED = "already used"
+    WRONG_EVENT = "wrong event"
+    NOT_VALID = "not valid"  # genuine code, but the ticket was cancelled or is unknown here
+    FORGED = "forged"
+
+    def __init__(self, status, ticketID=None, seatID=None, scanned_at=None):
+        self.status = status
+        self.ticketID = ticketID
+        self.seatID = seatID
+        self.scanned_at = scanned_at
+
+    @property
+    def admitted(self):
+        return self.status == ScanResult.ADMITTED
+
+class BloomFilter:
+    """A fixed-size Bloom filter of non-negative integers (no false negatives)."""
+
+    def __init__(self, capacity, error_rate=0.001):
+        """Size the filter for capacity items at the given false-positive rate."""
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.to_bytes(8, "little"), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, item):
+        bits = self.bits
+        for position in self._positions(item):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @classmethod
+    def from_bits(cls, size, hashes, bits):
+        bloom = object.__new__(cls)
+        bloom.size, bloom.hashes, bloom.bits = size, hashes, bytearray(bits)
+        return bloom
+
+class GateIndex:
+    """
+    Valid and used tickets of one event for the online gates, shared by all of
+    them. Scans are O(1) and thread-safe. With a log path, every admission is
+    appended to the log and the used set is rebuilt from it on start.
+    """
+    LOG_ENTRY = struct.Struct("<Iq")  # ticket ID, scan time in microseconds since 1970
+
+    def __init__(self, eventID, signer, log_path=None):
+        """Initialize an empty index for one event."""
+        self.eventID = eventID
+        self.signer = signer
+        self.valid = {}   # ticketID -> seatID
+        self.used = {}    # ticketID -> first scan time (microseconds since 1970)
+        self.double_entries = []  # (ticketID, first scan, repeated scan)
+        self._lock = threading.Lock()
+        self._log = None
+        if log_path is not None:
+            self._replay(log_path)
+            self._log = open(log_path, 'ab')
+
+    @classmethod
+    def from_store(cls, store, eventID, signer, log_path=None):
+        """Build the index for one event from the sold tickets in a TicketStore."""
+        index = cls(eventID, signer, log_path)
+        for ticket in store.all():
+            if ticket.event is not None and ticket.event.eventID == eventID:
+                index.add(ticket)
+        return index
+
+    def _replay(self, log_path):
+        try:
+            with open(log_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        whole = len(data) - len(data) % self.LOG_ENTRY.size  # drop a torn last entry
+        for ticketID, scanned_us in self.LOG_ENTRY.iter_unpack(data[:whole]):
+            self.used.setdefault(ticketID, scanned_us)
+
+    def add(self, ticket):
+        """Make a sold ticket valid for entry."""
+        with self._lock:
+            self.valid[ticket.ticketID] = self.signer.seat_of(ticket)
+
+    def revoke(self, ticketID):
+        """Stop admitting a cancelled ticket."""
+        with self._lock:
+            self.valid.pop(ticketID, None)
+
+    def scan(self, code, now=None):
+        """Check an entry code and admit its holder once. Returns a ScanResult."""
+        parsed = self.signer.parse(code)
+        if parsed is None:
+            return ScanResult(ScanResult.FORGED)
+        ticketID, eventID, seatID = parsed
+        if eventID != self.eventID:
+            return ScanResult(ScanResult.WRONG_EVENT, ticketID, seatID)
+        scanned_us = now if now is not None else time.time_ns() // 1000
+        with self._lock:
+            # A code for a cancelled ticket whose ID now names another seat is not valid
+            if ticketID not in self.valid or self.valid[ticketID] != seatID:
+                return ScanResult(ScanResult.NOT_VALID, ticketID, seatID)
+            first = self.used.get(ticketID)
+            if first is not None:
+                self.double_entries.append((ticketID, first, scanned_us))
+                return ScanResult(ScanResult.ALREADY_USED, ticketID, seatID, first)
+            self.used[ticketID] = scanned_us
+            if self._log is not None:
+                self._log.write(self.LOG_ENTRY.pack(ticketID, scanned_us))
+                self._log.flush()
+        return ScanResult(ScanResult.ADMITTED, ticketID, seatID)
+
+    def merge(self, scans):
+        """
+        Fold in (ticketID, scan time) entries from an offline scanner's log.
+        Returns the entries that were double entries (the ticket was already used).
+        """
+        doubles = []
+        with self._lock:
+            for ticketID, scanned_us in scans:
+                first = self.used.get(ticketID)
+                if first is not None and first != scanned_us:
+                    doubles.append((ticketID, first, scanned_us))
+                    continue
+                self.used[ticketID] = scanned_us
+                if self._log is not None and first is None:
+                    self._log.write(self.LOG_ENTRY.pack(ticketID, scanned_us))
+            if self._log is not None:
+                self._log.flush()
+            self.double_entries.extend(doubles)
+        return doubles
+
+    def snapshot(self, error_rate=0.001):
+        """Return a compact GateSnapshot (as bytes) for offline scanners."""
+        with self._lock:
+            bloom = BloomFilter(len(self.valid), error_rate)
+            for ticketID, seatID in self.valid.items():
+                bloom.add(TicketCodeSigner.entry_key(ticketID, seatID))
+            used = list(self.used)
+        return (GateSnapshot.HEADER.pack(GATE_SNAPSHOT_MAGIC, self.eventID, bloom.size, bloom.hashes, len(used))
+                + bytes(bloom.bits) + struct.pack(f"<{len(used)}I", *used))
+
+    def close(self):
+        """Close the scan log."""
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+class GateSnapshot:
+    """
+    An offline scanner's copy of one event's gate state: which tickets (ID and
+    seat) are valid (a Bloom filter, so a cancelled ticket is let in only at the
+    filter's small false-positive rate) and which were already used. Admissions are kept
+    in scans for merging back into the GateIndex when the scanner is online.
+    """
+    HEADER = struct.Struct("<4sIIII")  # magic, event ID, filter bits, hash count, used count
+
+    def __init__(self, data, signer):
+        """Load a snapshot made by GateIndex.snapshot."""
+        magic, self.eventID, size, hashes, used_count = self.HEADER.unpack_from(data)
+        if magic != GATE_SNAPSHOT_MAGIC:
+            raise RecordFormatError("Not a gate snapshot.")
+        bits_at = self.HEADER.size
+        used_at = bits_at + (size + 7) // 8
+        self.valid = BloomFilter.from_bits(size, hashes, data[bits_at:used_at])
+        self.used = set(struct.unpack_from(f"<{used_count}I", data, used_at))
+        self.signer = signer
+        self.scans = []  # (ticketID, scan time) admitted while offline
+
+    def scan(self, code, now=None):
+        """Check an entry code against the snapshot and admit its holder once."""
+        parsed = self.signer.parse(code)
+        if parsed is None:
+            return ScanResult(ScanResult.FORGED)
+        ticketID, eventID, seatID = parsed
+        if eventID != self.eventID:
+            return ScanResult(ScanResult.WRONG_EVENT, ticketID, seatID)
+        if TicketCodeSigner.entry_key(ticketID, seatID) not in self.valid:
+            return ScanResult(ScanResult.NOT_VALID, ticketID, seatID)
+        if ticketID in self.used:
+            return ScanResult(ScanResult.ALREADY_USED, ticketID, seatID)
+        self.used.add(ticketID)
+        self.scans.append((ticketID, now if now is not None else time.time_ns() // 1000))
+        return ScanResult(ScanResult.ADMITTED, ticketID, seatID)
+
+# -------------------- ARCHIVE --------------------#
+# Tickets for events that are over are moved out of the ticket file, which is
+# loaded in full and rewritten on every save, into one segment per event in
+# ARCHIVE_DIR. A segment is a zlib-compressed ticket record file that is never
+# changed after it is written: archiving more tickets for the same event
+# writes the next generation and removes the old one. The index lists every
+# segment with its ticket count, face value and a Bloom filter of its owners,
+# so reports never open a segment, and a purchase-history lookup only opens
+# the segments that may hold the user's tickets.
+ARCHIVE_DIR = 'archive'
+ARCHIVE_INDEX_FILE = 'index.dat'
+ARCHIVE_AFTER_DAYS = 30  # days after an event before its tickets are archived
+
+class ArchivedEvent:
+    """Index entry for one archived event's segment."""
+    __slots__ = ("eventID", "name", "date", "generation", "tickets", "first_id", "last_id", "value", "owners")
+
+    def __init__(self, eventID, name, date, generation, tickets, first_id, last_id, value, owners):
+        self.eventID = eventID
+        self.name = name
+        self.date = date
+        self.generation = generation
+        self.tickets = tickets    # number of tickets in the segment
+        self.first_id = first_id  # lowest and highest ticket ID in it
+        self.last_id = last_id
+        self.value = value        # total face value
+        self.owners = owners      # BloomFilter of the owners' user IDs
+
+    @property
+    def filename(self):
+        return f"event-{self.eventID}-{self.generation}.seg"
+
+class TicketArchive:
+    """
+    The archived tickets of finished events. The index is small and read in
+    full by load(); segments are decompressed on demand, and the last few
+    are kept decoded.
+    """
+    CACHED_SEGMENTS = 4
+
+    def __init__(self, events, directory=ARCHIVE_DIR):
+        """Initialize with the events archived tickets belong to; call load() before use."""
+        self.events = {event.eventID: event for event in events}
+        self.directory = directory
+        self.lock = threading.Lock()
+        self._index = {}                # eventID -> ArchivedEvent
+        self._segments = OrderedDict()  # eventID -> decoded tickets, least recently used first
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def load(self):
+        """Read the archive index. Returns the archive."""
+        try:
+            entries = list(read_records(self._path(ARCHIVE_INDEX_FILE), ArchiveIndexCodec()))
+        except FileNotFoundError:
+            entries = []
+        with self.lock:
+            self._index = {entry.eventID: entry for entry in entries}
+            self._segments.clear()
+        return self
+
+    def __len__(self):
+        return sum(entry.tickets for entry in self._index.values())
+
+    def is_archived(self, eventID):
+        """Return True if the event's tickets have been archived (its sales are closed)."""
+        return eventID in self._index
+
+    def entries(self):
+        """Return the index entries, one per archived event."""
+        return list(self._index.values())
+
+    def finished_events(self, today=None, after_days=ARCHIVE_AFTER_DAYS):
+        """Return the events that ended more than after_days before today and are not archived yet."""
+        cutoff = (today or date.today()) - timedelta(days=after_days)
+        return [event for event in self.events.values()
+                if event.date is not None and event.date < cutoff and event.eventID not in self._index]
+
+    def tickets(self, eventID):
+        """Return the archived tickets of one event, or [] if it is not archived."""
+        with self.lock:
+            entry = self._index.get(eventID)
+            if entry is None:
+                return []
+            tickets = self._segments.get(eventID)
+            if tickets is not None:
+                self._segments.move_to_end(eventID)
+                return list(tickets)
+        tickets = self._read(entry)
+        with self.lock:
+            if self._index.get(eventID) is entry:
+                self._segments[eventID] = tickets
+                while len(self._segments) > self.CACHED_SEGMENTS:
+                    self._segments.popitem(last=False)
+        return list(tickets)
+
+    def for_owner(self, ownerID):
+        """Return one user's archived tickets, opening only the segments their ID may be in."""
+        found = []
+        for entry in self.entries():
+            if ownerID in entry.owners:
+                found.extend(ticket for ticket in self.tickets(entry.eventID) if ticket.ownerID == ownerID)
+        return found
+
+    def _read(self, entry):
+        path = self._path(entry.filename)
+        with open(path, 'rb') as f:
+            try:
+                data = zlib.decompress(f.read())
+            except zlib.error as e:
+                raise RecordFormatError(f"{path} is not a valid archive segment: {e}") from None
+        return list(decode_records(data, path, TicketCodec(self.events)))
+
+    def archive(self, store, events):
+        """
+        Move every ticket for the given events from the store into the archive
+        and save the store. Events are archived even if they sold nothing, which
+        closes their sales. Segments and the index are written before the store
+        drops the tickets, so if this is interrupted it can simply be run again:
+        tickets already in a segment are merged by ID, not archived twice.
+        Returns the number of tickets moved.
+        """
+        moving = {event.eventID: [] for event in events}
+        for ticket in store.all():
+            if ticket.event is not None and ticket.event.eventID in moving:
+                moving[ticket.event.eventID].append(ticket)
+        # Unsold tickets leave the store with the rest but are not archived
+        kept = {eventID: [ticket for ticket in tickets if is_sold(ticket)] for eventID, tickets in moving.items()}
+
+        os.makedirs(self.directory, exist_ok=True)
+        written, replaced = {}, []
+        for event in events:
+            tickets = kept[event.eventID]
+            old = self._index.get(event.eventID)
+            if old is not None:
+                if not tickets:
+                    continue
+                merged = {ticket.ticketID: ticket for ticket in self._read(old)}
+                merged.update((ticket.ticketID, ticket) for ticket in tickets)
+                tickets = list(merged.values())
+                replaced.append(old)
+            tickets.sort(key=lambda ticket: ticket.ticketID)
+            owners = {ticket.ownerID for ticket in tickets if ticket.ownerID is not None}
+            bloom = BloomFilter(len(owners), 0.01)
+            for ownerID in owners:
+                bloom.add(ownerID)
+            entry = ArchivedEvent(event.eventID, event.name, event.date, old.generation + 1 if old else 1,
+                                  len(tickets), tickets[0].ticketID if tickets else 0,
+                                  tickets[-1].ticketID if tickets else 0,
+                                  sum(face_value(ticket) for ticket in tickets), bloom)
+            atomic_write(self._path(entry.filename), zlib.compress(encode_records(TicketCodec(), tickets)))
+            written[event.eventID] = entry
+        if not written:
+            return 0
+
+        index = dict(self._index)
+        index.update(written)
+        atomic_write(self._path(ARCHIVE_INDEX_FILE), encode_records(ArchiveIndexCodec(), index.values()))
+        with self.lock:
+            self._index = index
+            for eventID in written:
+                self._segments.pop(eventID, None)
+
+        moved = 0
+        for tickets in moving.values():
+            for ticket in tickets:
+                if store.remove(ticket.ticketID) is not None:
+                    moved += 1
+        commit = store.save()
+        if commit is not None:
+            commit.wait()
+        for old in replaced:
+            try:
+                os.unlink(self._path(old.filename))
+            except OSError:
+                pass
+        return moved
+
+# -------------------- SEAT FEED --------------------#
+# Each event has a SeatFeed: the current state of every seat plus a numbered
+# log of changes. A change is published once, whatever the number of
+# watchers: it is appended to a ring buffer with its wire encoding made up
+# front. Watchers keep only a cursor (the last sequence number they saw) and
+# read what changed after it when they poll, as one delta holding the latest
+# state of each changed seat; watchers polling at the same pace share the same
+# encoded delta. A watcher that falls further behind than the ring buffer holds
+# gets a snapshot of every seat instead, built at most once per sequence
+# number and shared by everyone who needs it.
+# On the wire, seats are numbered row by row from 0 (row 1 seat 1 is 0).
+SEAT_FEED_MAGIC = b"GPSF"
+SEAT_MESSAGE = struct.Struct("<4sBIQ")    # magic, kind, event ID, sequence number
+SEAT_DELTA_COUNT = struct.Struct("<I")    # delta: number of changes, then that many SEAT_CHANGEs
+SEAT_CHANGE = struct.Struct("<IB")        # seat number, new state
+SEAT_GRID = struct.Struct("<HH")          # snapshot: rows, seats per row, then one state byte per seat
+
+class SeatFeed:
+    """Seat states of one event and the feed of changes to them."""
+    FREE, HELD, SOLD = 0, 1, 2
+    DELTA, SNAPSHOT = 0, 1
+
+    def __init__(self, event, history=1024):
+        """Start the feed from the venue's current seats (reserved seats count as sold)."""
+        venue = event.venue
+        self.eventID = event.eventID
+        self.rows, self.seats_per_row = venue.rows, venue.seats_per_row
+        seats = [seat for row in venue.seats for seat in row]
+        self.states = bytearray(self.SOLD if seat.is_reserved else self.FREE for seat in seats)
+        self.sequence = 0
+        self._numbers = {seat: number for number, seat in enumerate(seats)}
+        self._log = deque(maxlen=history)  # (sequence, changes, encoded delta)
+        self._snapshot = None              # (sequence, encoded snapshot)
+        self._merged = {}                  # from sequence -> encoded delta up to _merged_at
+        self._merged_at = 0
+        self._changed = threading.Condition()
+
+    def publish(self, seats, state):
+        """
+        Record that seats are now in state (FREE, HELD or SOLD). Seats already in
+        that state are left out. Returns the new sequence number, or None if
+        nothing changed.
+        """
+        with self._changed:
+            changes = []
+            for seat in seats:
+                number = self._numbers.get(seat)
+                if number is not None and self.states[number] != state:
+                    self.states[number] = state
+                    changes.append((number, state))
+            if not changes:
+                return None
+            self.sequence += 1
+            self._log.append((self.sequence, changes, self._encode(changes)))
+            self._changed.notify_all()
+            return self.sequence
+
+    def _encode(self, changes):
+        return b"".join([SEAT_MESSAGE.pack(SEAT_FEED_MAGIC, self.DELTA, self.eventID, self.sequence),
+                         SEAT_DELTA_COUNT.pack(len(changes))]
+                        + [SEAT_CHANGE.pack(number, state) for number, state in changes])
+
+    @staticmethod
+    def _net(items):
+        # The latest state of each seat changed by the log items
+        latest = {}
+        for _, changes, _ in items:
+            latest.update(changes)
+        return list(latest.items())
+
+    def _after(self, sequence):
+        # Caller holds the lock. Log items after sequence, or None if the watcher
+        # must resync (new, too far behind, or ahead of a restarted feed)
+        if sequence == self.sequence:
+            return []
+        if sequence > self.sequence or not self._log or sequence < self._log[0][0] - 1:
+            return None
+        return list(islice(self._log, len(self._log) - (self.sequence - sequence), None))
+
+    def changes_since(self, sequence):
+        """
+        Return (sequence, states, changes) for a watcher that has seen up to
+        sequence. changes is a list of (seat number, state); if the watcher is
+        too far behind (or new, with sequence -1) states is a copy of every
+        seat's state and changes is empty.
+        """
+        with self._changed:
+            items = self._after(sequence)
+            if items is None:
+                return self.sequence, bytes(self.states), []
+            return self.sequence, None, self._net(items)
+
+    def messages_since(self, sequence, timeout=None):
+        """
+        Return (sequence, encoded message or None) for a remote watcher: one
+        delta with everything that changed after sequence, a snapshot if it is
+        too far behind, or None if nothing changed. Waits up to timeout seconds
+        for a change if there is none yet.
+        """
+        with self._changed:
+            if timeout and sequence == self.sequence:
+                self._changed.wait_for(lambda: self.sequence != sequence, timeout)
+            items = self._after(sequence)
+            if items is None:
+                return self.sequence, self.snapshot()
+            if len(items) <= 1:
+                return self.sequence, items[0][2] if items else None
+            if self._merged_at != self.sequence:
+                self._merged, self._merged_at = {}, self.sequence
+            message = self._merged.get(sequence)
+            if message is None:
+                message = self._merged[sequence] = self._encode(self._net(items))
+            return self.sequence, message
+
+    def snapshot(self):
+        """Return the encoded state of every seat (the same bytes until the next change)."""
+        with self._changed:
+            if self._snapshot is None or self._snapshot[0] != self.sequence:
+                self._snapshot = (self.sequence,
+                                  SEAT_MESSAGE.pack(SEAT_FEED_MAGIC, self.SNAPSHOT, self.eventID, self.sequence)
+                                  + SEAT_GRID.pack(self.rows, self.seats_per_row) + bytes(self.states))
+            return self._snapshot[1]
+
+    def seat_number(self, seat):
+        """Return a seat's number in this feed, or None if it is not in the venue."""
+        return self._numbers.get(seat)
+
+def decode_seat_message(data):
+    """
+    Decode a feed message for a remote client. Returns (kind, eventID, sequence,
+    payload): for a DELTA the payload is a list of (seat number, state), for a
+    SNAPSHOT it is (rows, seats per row, states).
+    """
+    magic, kind, eventID, sequence = SEAT_MESSAGE.unpack_from(data)
+    if magic != SEAT_FEED_MAGIC:
+        raise RecordFormatError("Not a seat feed message.")
+    offset = SEAT_MESSAGE.size
+    if kind == SeatFeed.DELTA:
+        (changes,) = SEAT_DELTA_COUNT.unpack_from(data, offset)
+        offset += SEAT_DELTA_COUNT.size
+        return kind, eventID, sequence, list(SEAT_CHANGE.iter_unpack(data[offset:offset + changes * SEAT_CHANGE.size]))
+    rows, seats_per_row = SEAT_GRID.unpack_from(data, offset)
+    offset += SEAT_GRID.size
+    return kind, eventID, sequence, (rows, seats_per_row, data[offset:offset + rows * seats_per_row])
+
+class SeatFeeds:
+    """The seat feeds of all events, each made when first used."""
+
+    def __init__(self):
+        """Initialize with no feeds."""
+        self._feeds = {}  # eventID -> SeatFeed
+        self._lock = threading.Lock()
+
+    def feed(self, event):
+        """Return the event's feed, starting it from the venue's current seats if needed."""
+        with self._lock:
+            feed = self._feeds.get(event.eventID)
+            if feed is None:
+                feed = self._feeds[event.eventID] = SeatFeed(event)
+            return feed
+
+    def publish(self, event, seats, state):
+        """Record a change of seats at an event; see SeatFeed.publish."""
+        if event is None or event.venue is None:
+            return None
+        return self.feed(event).publish(seats, state)
+
+# -------------------- WAITLIST --------------------#
+# Fans can queue for a sold-out event. When a seat is given back (a cancelled
+# ticket or an abandoned checkout) it is held for the first person in line for
+# a limited time; if they do not book it, it moves on to the next one. Season
+# members go first, then by ticket type, then by when they joined.
+WAITLIST_PRIORITY = {SeasonMembership: 0, WeekendPackage: 1, GroupDiscount: 2, SingleRacePass: 3, Ticket: 3}
+
+class WaitlistEntry:
+    """One person waiting for a seat at an event."""
+    __slots__ = ("eventID", "userID", "ticket_type", "priority", "joined_us", "active")
+
+    def __init__(self, eventID, userID, ticket_type, priority, joined_us):
+        self.eventID = eventID
+        self.userID = userID
+        self.ticket_type = ticket_type
+        self.priority = priority
+        self.joined_us = joined_us
+        self.active = True  # cleared when the entry leaves the queue (left, or got an offer)
+
+class SeatOffer:
+    """A seat held for a waitlisted user until expires_at (seconds since 1970)."""
+    __slots__ = ("entry", "event", "seat", "expires_at")
+
+    def __init__(self, entry, event, seat, expires_at):
+        self.entry = entry
+        self.event = event
+        self.seat = seat
+        self.expires_at = expires_at
+
+class Waitlist:
+    """
+    Per-event waitlists kept as heaps ordered by (priority, join time), plus the
+    outstanding seat offers in a heap ordered by expiry. Joining, leaving, and
+    handing a released seat on are all O(log n): leaving only marks the entry,
+    and marked entries are skipped when they reach the top of the heap.
+    """
+
+    def __init__(self, events, hold_seconds=15 * 60, path=WAITLIST_FILE, persistence=None, clock=time.time,
+                 feeds=None):
+        """
+        Initialize with the events seats belong to and how long an offer holds a
+        seat. Seats that are freed or held for an offer are published to feeds
+        (a SeatFeeds), if given.
+        """
+        self.events = {event.eventID: event for event in events}
+        self.hold_seconds = hold_seconds
+        self.path = path
+        self.persistence = persistence
+        self.clock = clock
+        self.feeds = feeds
+        self.lock = threading.RLock()
+        self._queues = {}   # eventID -> heap of (priority, joined_us, sequence, entry)
+        self._entries = {}  # (eventID, userID) -> WaitlistEntry, waiting or holding an offer
+        self._counts = {}   # eventID -> number of people waiting
+        self._offers = {}   # (eventID, userID) -> SeatOffer
+        self._held = {}     # (eventID, seatID) -> SeatOffer holding that seat
+        self._expiry = []   # heap of (expires_at, sequence, offer)
+        self._sequence = count()
+
+    @staticmethod
+    def priority_for(ticket_type, history=None):
+        """Return the queue priority (lower goes first) for a ticket type and purchase history."""
+        priority = WAITLIST_PRIORITY.get(ticket_type, len(WAITLIST_PRIORITY))
+        if history is not None and any(isinstance(t, SeasonMembership) for t in history.get_history()):
+            priority = WAITLIST_PRIORITY[SeasonMembership]
+        return priority
+
+    def load(self):
+        """Read the saved queues (offers are not saved; their holders rejoin the line)."""
+        try:
+            entries = list(read_records(self.path, WaitlistCodec()))
+        except (FileNotFoundError, RecordFormatError):
+            entries = []
+        with self.lock:
+            for entry in entries:
+                self._enqueue(entry)
+
+    def _enqueue(self, entry):
+        entry.active = True
+        self._entries[(entry.eventID, entry.userID)] = entry
+        heapq.heappush(self._queues.setdefault(entry.eventID, []),
+                       (entry.priority, entry.joined_us, next(self._sequence), entry))
+        self._counts[entry.eventID] = self._counts.get(entry.eventID, 0) + 1
+
+    def join(self, eventID, userID, ticket_type, priority=None):
+        """Put a user in line for an event; raises WaitlistError if they already are."""
+        with self.lock:
+            if (eventID, userID) in self._entries:
+                raise WaitlistError("You are already on the waitlist for this event.")
+            if priority is None:
+                priority = self.priority_for(ticket_type)
+            entry = WaitlistEntry(eventID, userID, ticket_type, priority, time.time_ns() // 1000)
+            self._enqueue(entry)
+            self.save()
+            return entry
+
+    def leave(self, eventID, userID):
+        """Take a user out of line (an offer they hold is declined). Returns True if they were in it."""
+        with self.lock:
+            offer = self._offers.get((eventID, userID))
+            if offer is not None:
+                self.decline(offer)
+                return True
+            entry = self._entries.pop((eventID, userID), None)
+            if entry is None:
+                return False
+            entry.active = False
+            self._counts[eventID] -= 1
+            self.save()
+            return True
+
+    def waiting(self, eventID):
+        """Return how many people are waiting for an event."""
+        return self._counts.get(eventID, 0)
+
+    def position(self, eventID, userID):
+        """Return a user's 1-based place in line, or None (O(n); for display only)."""
+        with self.lock:
+            entry = self._entries.get((eventID, userID))
+            if entry is None or not entry.active:
+                return None
+            key = (entry.priority, entry.joined_us)
+            return 1 + sum(1 for priority, joined_us, _, other in self._queues.get(eventID, ())
+                           if other.active and (priority, joined_us) < key)
+
+    def seat_released(self, event, seat):
+        """
+        Hand a seat that was given back to the next person in line, holding it
+        for them, and return the SeatOffer. With nobody waiting the seat is
+        freed and None is returned. A seat that is not reserved or is already
+        held for an offer was released before, so it is left alone (None).
+        """
+        with self.lock:
+            if not seat.is_reserved or (event.eventID, seat.seatID) in self._held:
+                return None
+            line = self._queues.get(event.eventID)
+            while line:
+                entry = heapq.heappop(line)[-1]
+                if entry.active:
+                    break
+            else:
+                with SEAT_LOCK:  # a buyer may be checking the seat in hold_seats right now
+                    seat.is_reserved = False
+                if self.feeds is not None:
+                    self.feeds.publish(event, [seat], SeatFeed.FREE)
+                return None
+            entry.active = False
+            self._counts[event.eventID] -= 1
+            with SEAT_LOCK:
+                seat.is_reserved = True  # held for the offer
+            if self.feeds is not None:
+                self.feeds.publish(event, [seat], SeatFeed.HELD)
+            offer = SeatOffer(entry, event, seat, self.clock() + self.hold_seconds)
+            self._offers[(event.eventID, entry.userID)] = offer
+            self._held[(event.eventID, seat.seatID)] = offer
+            heapq.heappush(self._expiry, (offer.expires_at, next(self._sequence), offer))
+            self.save()
+            return offer
+
+    def offers_for(self, userID):
+        """Return the live seat offers held for a user."""
+        with self.lock:
+            now = self.clock()
+            return [offer for (_, owner), offer in self._offers.items()
+                    if owner == userID and offer.expires_at > now]
 
-    def __init__(self, seatID):
-        """Initialize a seat with a unique ID and reservation status."""
-        self.seatID = seatID
-        self.is_reserved = False
+    def is_live(self, offer):
+        """Return True if the offer has not been claimed, declined or expired."""
+        with self.lock:
+            return (self._offers.get((offer.event.eventID, offer.entry.userID)) is offer
+                    and offer.expires_at > self.clock())
 
-    def reserve(self):
-        """Reserve the seat if it's not already reserved."""
-        if not self.is_reserved:
-            self.is_reserved = True
+    def claim(self, offer):
+        """Take up an offer when its seat is bought. Returns False if it was no longer live."""
+        with self.lock:
+            if not self.is_live(offer):
+                return False
+            self._close(offer)
+            self.save()
             return True
-        return False
 
-class Discount:
-    """Represents a discount applied to ticket prices."""
+    def decline(self, offer):
+        """Turn an offer down; the seat goes to the next person in line."""
+        with self.lock:
+            if self._offers.get((offer.event.eventID, offer.entry.userID)) is offer:
+                self._close(offer)
+                self.seat_released(offer.event, offer.seat)
+                self.save()
 
-    def __init__(self, discountID, description, percentage):
-        """Initialize a discount with ID, description, and percentage."""
-        self.discountID = discountID
-        self.description = description
-        self.percentage = percentage
+    def remove_user(self, userID):
+        """Take a user out of every line, declining any offers they hold (O(n))."""
+        with self.lock:
+            for eventID, owner in [key for key in self._entries if key[1] == userID]:
+                self.leave(eventID, owner)
 
-    def get_discountID(self):
-        return self.discountID
-    
-    def set_discountID(self, discountID):
-        self.discountID = discountID
-    
-    def get_description(self):
-        return self.description
-    
-    def set_description(self, description):
-        self.description = description
-    
-    def get_percentage(self):
-        return self.percentage
-    
-    def set_percentage(self, percentage):
-        self.percentage = percentage
-    
-    def apply_discount(self, amount):
-        """Return the price after applying the discount percentage."""
-        return amount * (1 - self.percentage/100)
-    
-class DiscountManager:
-    """Handles storage and GUI for managing multiple discounts."""
-    
-    def __init__(self):
-        """Load existing discounts from file or initialize an empty list."""
-        try:
-            with open('discounts.pkl', 'rb') as f:
-                self.discounts = pickle.load(f)
-        except FileNotFoundError:
-            self.discounts = []
+    def expire(self):
+        """Pass on the seats of offers that ran out. Returns the new offers made."""
+        made = []
+        expired = False
+        with self.lock:
+            now = self.clock()
+            while self._expiry and self._expiry[0][0] <= now:
+                offer = heapq.heappop(self._expiry)[-1]
+                if self._offers.get((offer.event.eventID, offer.entry.userID)) is offer:
+                    expired = True
+                    self._close(offer)
+                    new_offer = self.seat_released(offer.event, offer.seat)
+                    if new_offer is not None:
+                        made.append(new_offer)
+            if expired:
+                self.save()
+        return made
 
-    def save_discounts(self):
-        """Save all discounts to the discounts file."""
-        with open('discounts.pkl', 'wb') as f:
-            pickle.dump(self.discounts, f)
+    def _close(self, offer):
+        # Caller holds the lock; the offer's expiry heap item is skipped when popped
+        del self._offers[(offer.event.eventID, offer.entry.userID)]
+        self._held.pop((offer.event.eventID, offer.seat.seatID), None)
+        self._entries.pop((offer.event.eventID, offer.entry.userID), None)
 
-    def manage_discounts(self):
-        """Display a Tkinter window to add and save discounts."""
-        management_window = tk.Toplevel()
-        management_window.title("Discount Management")
-        management_window.geometry("400x300")
-        management_window.minsize(400, 300)
-        
-        content_frame = ttk.Frame(management_window, padding=20)
-        content_frame.pack(fill="both", expand=True)
-        
-        ttk.Label(content_frame, text="Discount ID:").grid(row=0, column=0, sticky="w", pady=5)
-        ttk.Label(content_frame, text="Description:").grid(row=1, column=0, sticky="w", pady=5)
-        ttk.Label(content_frame, text="Percentage:").grid(row=2, column=0, sticky="w", pady=5)
-        
-        id_entry = ttk.Entry(content_frame, width=30)
-        desc_entry = ttk.Entry(content_frame, width=30)
-        perc_entry = ttk.Entry(content_frame, width=30)
-        
-        id_entry.grid(row=0, column=1, sticky="ew", padx=5)
-        desc_entry.grid(row=1, column=1, sticky="ew", padx=5)
-        perc_entry.grid(row=2, column=1, sticky="ew", padx=5)
-        
-        content_frame.columnconfigure(1, weight=1)
-        
-        def add_discount():
-            """Add a new discount entry from the form input."""
-            try:
-                discount = Discount( 
-                    int(id_entry.get()),
-                    desc_entry.get(),
-                    float(perc_entry.get())
-                )
-                self.discounts.append(discount)
-                self.save_discounts()
-                messagebox.showinfo("Success", "Discount added successfully")
-                management_window.destroy()  # ✅ Close the window after success
-            except Exception as e:
-                messagebox.showerror("Error", f"Invalid discount data: {str(e)}")
+    def save(self):
+        """Queue a write of everyone waiting (offer holders included, in their old place)."""
+        if self.persistence is None:
+            return None
+        return self.persistence.write(self.path, self._serialize)
 
-        btn_frame = ttk.Frame(content_frame)
-        btn_frame.grid(row=3, column=0, columnspan=2, pady=15)
-        
-        ttk.Button(btn_frame, text="Add Discount", command=add_discount, width=20).pack()
+    def _serialize(self):
+        with self.lock:
+            entries = list(self._entries.values())
+        return encode_records(WaitlistCodec(), entries)
 
-class Payment:
-    """Handles user payment data and basic validation."""
-    def __init__(self, paymentID, amount, method, card_number=None, expiry=None):
-        """Initialize payment with amount, method, and optional card info."""
-        self.paymentID = paymentID
-        self.amount = amount
-        self.date = datetime.now()
-        self.method = method
-        self.card_number = card_number
-        self.expiry = expiry
+# -------------------- BACKGROUND WORK --------------------#
+class BackgroundTasks:
+    """
+    Runs blocking storage and payment work on a thread pool and hands results
+    back on the Tk thread. Tasks that share a key (e.g. one user's writes) run
+    one at a time in submission order; others run side by side. Controls passed
+    with a task stay disabled until it finishes, and on_busy is told how many
+    tasks are pending whenever that changes. Call submit and watch from the Tk
+    thread only.
+    """
 
-    def process_payment(self):
-        """Return True if the payment is valid, otherwise False."""
-        if self.validate_card():
-            return True
-        return False
+    def __init__(self, root, workers=4, poll_ms=30, on_busy=None):
+        """Initialize with the Tk root whose event loop receives the results."""
+        self.root = root
+        self.poll_ms = poll_ms
+        self.on_busy = on_busy
+        self.pending = 0
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="background")
+        self._finished = queue.SimpleQueue()  # (future, on_done, on_error, controls) for the Tk thread
+        self._waiting = {}                    # key -> deque of tasks queued behind the running one
+        self._disabled = {}                   # widget -> number of pending tasks holding it
+        self._lock = threading.Lock()
+        self._polling = False
 
-    def validate_card(self):
-        """Validate credit card number and expiry format."""
-        if self.method == "Credit/Debit":
-            return re.match(r'^\d{16}$', self.card_number) and re.match(r'^\d{2}/\d{2}$', self.expiry)
-        return True
+    def submit(self, func, *args, key=None, on_done=None, on_error=None, controls=()):
+        """
+        Run func(*args) in the background and return its Future. on_done(result)
+        or on_error(exception) is then called on the Tk thread.
+        """
+        future = Future()
+        task = (future, func, args)
+        if key is None:
+            self._pool.submit(self._run, None, task)
+        else:
+            with self._lock:
+                waiting = self._waiting.get(key)
+                if waiting is None:
+                    self._waiting[key] = deque()
+                else:
+                    waiting.append(task)
+                    task = None
+            if task is not None:
+                self._pool.submit(self._run, key, task)
+        return self.watch(future, on_done, on_error, controls)
 
-class PurchaseHistory:
-    """Tracks tickets purchased by a user."""
-    
-    def __init__(self):
-        """Initialize with an empty list of tickets."""
-        self.tickets = []
+    def watch(self, future, on_done=None, on_error=None, controls=()):
+        """Call on_done(result) or on_error(exception) on the Tk thread when future finishes."""
+        for widget in controls:
+            if not self._disabled.get(widget):
+                widget.configure(state="disabled")
+            self._disabled[widget] = self._disabled.get(widget, 0) + 1
+        self._set_pending(self.pending + 1)
+        future.add_done_callback(lambda f: self._finished.put((f, on_done, on_error, controls)))
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self._poll)
+        return future
 
-    def add_ticket(self, ticket):
-        """Add a ticket to the purchase history."""
-        self.tickets.append(ticket)
-        
-    def get_history(self):
-        """Return all purchased tickets."""
-        return self.tickets
+    def _run(self, key, task):
+        # Runs on a pool thread; keyed tasks drain their queue on the same thread
+        while True:
+            future, func, args = task
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+            if key is None:
+                return
+            with self._lock:
+                waiting = self._waiting[key]
+                if not waiting:
+                    del self._waiting[key]
+                    return
+                task = waiting.popleft()
+
+    def _poll(self):
+        # A failing callback must not stop the polling, or every later result is lost
+        try:
+            while True:
+                try:
+                    future, on_done, on_error, controls = self._finished.get_nowait()
+                except queue.Empty:
+                    break
+                for widget in controls:
+                    self._disabled[widget] -= 1
+                    if not self._disabled[widget]:
+                        del self._disabled[widget]
+                        try:
+                            if widget.winfo_exists():
+                                widget.configure(state="normal")
+                        except Exception as e:
+                            print(f"⚠️ Could not re-enable a control: {e}")
+                self._set_pending(self.pending - 1)
+                self._deliver(future, on_done, on_error)
+        finally:
+            if self.pending:
+                self.root.after(self.poll_ms, self._poll)
+            else:
+                self._polling = False
+
+    def _deliver(self, future, on_done, on_error):
+        try:
+            error = future.exception()
+            if error is None:
+                if on_done:
+                    on_done(future.result())
+                return
+            if on_error:
+                on_error(error)
+                return
+        except Exception as e:
+            error = e
+            print(f"⚠️ Background task callback failed: {e!r}")
+        else:
+            print(f"⚠️ Background task failed: {error}")
+        try:
+            messagebox.showerror("Error", str(error))
+        except Exception:
+            pass  # no Tk to show it on
+
+    def _set_pending(self, count):
+        self.pending = count
+        if self.on_busy:
+            self.on_busy(count)
+
+    def shutdown(self, wait=True):
+        """Stop the worker threads, optionally waiting for queued tasks."""
+        self._pool.shutdown(wait=wait)
 
 # -------------------- GUI IMPLEMENTATION --------------------
-from datetime import date
 class GrandPrixApp:
+    WAITLIST_TICK_MS = 5000
+    SEAT_FEED_POLL_MS = 250
     def __init__(self):
         # Initialize the main application window with styling and layout
+        load_tk()
         self.root = tk.Tk()
         self.root.configure(bg="#f5f0e1")  #Set root window to light beige
         self.root.title("Grand Prix Experience")
@@ -301,15 +3026,29 @@ class GrandPrixApp:
         
         # Initialize session variables and events
         self.current_user = None
-        self.events = [
-            Event(1, "Silverstone GP", date(2025, 6, 1), Venue(1, "Silverstone Circuit", 150000, 10, 10)),
-            Event(2, "Monaco GP", date(2025, 6, 15), Venue(2, "Monaco Circuit", 120000, 10, 10)),
-            Event(3, "Yas Marina GP", date(2025, 7, 1), Venue(3, "Yas Marina Circuit", 130000, 10, 10))
-        ]
+        self.sessions = SessionManager()
+        self.session_token = None  # Authorizes booking calls for current_user
+        self.payments = PaymentProcessor()  # Charges run off the Tk thread
+        self.credentials = CredentialService()  # Password hashing runs in worker processes
+        self.events = default_events()
 
-        # Load user and discount data from files
+        # Load user, ticket and discount data from files
+        self.persistence = PersistenceQueue()  # Group-commits file writes in the background
+        self.archive = TicketArchive(self.events)  # Tickets of finished events, read on demand
+        self.tickets = TicketStore(self.events, persistence=self.persistence, archive=self.archive)
+        self.gate_signer = TicketCodeSigner(load_gate_key())  # Signs the entry code on each ticket
+        self.gates = {}  # eventID -> GateIndex, built when gate scanning starts
+        self.seat_feeds = SeatFeeds()  # Live seat changes for open seat maps
         self.load_data()
         
+        # Status bar with a progress indicator, shown while background work is pending
+        self.status_bar = ttk.Frame(self.root, padding=(10, 2))
+        self.status_label = ttk.Label(self.status_bar, text="Working...")
+        self.status_label.pack(side="left")
+        self.progress = ttk.Progressbar(self.status_bar, mode="indeterminate", length=120)
+        self.progress.pack(side="right")
+        self.background = BackgroundTasks(self.root, on_busy=self.show_busy)
+
         # Set up the main container for GUI layout
         self.main_container = ttk.Frame(self.root)
         self.main_container.pack(fill="both", expand=True)
@@ -317,45 +3056,49 @@ class GrandPrixApp:
         # Display the login screen on launch
         self.create_login_frame()
 
+        # Pass on expired waitlist offers and tell the current user about new ones
+        self._offers_shown = set()
+        self.root.after(self.WAITLIST_TICK_MS, self.tick_waitlist)
+
     def load_data(self):
         # Load registered users
         try:
-            with open('users.pkl', 'rb') as f:
-                self.users = pickle.load(f)
-                print(f"✅ Loaded {len(self.users)} users from file.")
-        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            self.users = list(read_records(USERS_FILE, UserCodec()))
+            print(f"✅ Loaded {len(self.users)} users from file.")
+        except (FileNotFoundError, RecordFormatError):
             print("⚠️ No users file found or it was empty/corrupted.")
             self.users = []
 
-        # Load available discounts
+        # Passwords older versions stored in clear are hashed at each user's next
+        # login; hashing them all here would hold up the window (admin.py compact
+        # hashes them in bulk)
+
+        # Load the archive index; archived tickets are only read when asked for
+        try:
+            self.archive.load()
+        except RecordFormatError as e:
+            print(f"⚠️ Could not read the ticket archive: {e}")
+
+        # Load sold tickets; purchase histories read them lazily from the store
         try:
-            with open('discounts.pkl', 'rb') as f:
-                self.discounts = pickle.load(f)
-        except (FileNotFoundError, EOFError):
-            self.discounts = []
-
-    # Remove any button references from objects before pickling
-    def strip_gui_from_users(self):
-        for user in self.users:
-            for ticket in user.purchase_history.get_history():
-                if ticket.seat and hasattr(ticket.seat, "button"):
-                    del ticket.seat.button
-    def strip_gui_from_venue(self):
-        for event in self.events:
-            for row in event.venue.seats:
-                for seat in row:
-                    if hasattr(seat, "button"):
-                        del seat.button
+            self.tickets.load(self.users)
+        except RecordFormatError as e:
+            print(f"⚠️ Could not read tickets: {e}")
+            self.tickets.load_tickets([], self.users)
+
+        # Load available discounts into the shared, self-refreshing catalogue
+        self.discounts = DiscountManager(persistence=self.persistence)
+
+        # Load the waitlists for sold-out events
+        self.waitlist = Waitlist(self.events, persistence=self.persistence, feeds=self.seat_feeds)
+        self.waitlist.load()
 
     def save_data(self):
-        # Clean GUI elements and save all user + discount data to disk
-        self.strip_gui_from_users()
-        self.strip_gui_from_venue()
-        with open('users.pkl', 'wb') as f:
-            pickle.dump(self.users, f)
+        # Queue the user data for writing (the discount manager saves its own
+        # changes). Returns the PendingCommit (None inside a batch; use the
+        # batch's commit).
         print(f"💾 Saving {len(self.users)} users...")
-        with open('discounts.pkl', 'wb') as f:
-            pickle.dump(self.discounts, f)
+        return self.persistence.write(USERS_FILE, lambda: encode_records(UserCodec(), self.users))
 
 
     def create_login_frame(self):
@@ -386,25 +3129,43 @@ class GrandPrixApp:
         button_frame = ttk.Frame(self.login_frame)
         button_frame.grid(row=3, column=0, columnspan=2, pady=15)
         
-        ttk.Button(button_frame, text="Login", command=self.login, width=12).pack(side="left", padx=5)
+        self.login_button = ttk.Button(button_frame, text="Login", command=self.login, width=12)
+        self.login_button.pack(side="left", padx=5)
         ttk.Button(button_frame, text="Register", command=self.create_registration_frame, width=12).pack(side="left", padx=5)
         
         spacer_bottom = ttk.Frame(self.main_container)
         spacer_bottom.pack(fill="both", expand=True)
 
+    def show_busy(self, pending):
+        # Show the status bar and animate the progress bar while work is pending
+        if pending and not self.status_bar.winfo_ismapped():
+            self.status_bar.pack(side="bottom", fill="x", before=self.main_container)
+            self.progress.start(15)
+        elif not pending and self.status_bar.winfo_ismapped():
+            self.progress.stop()
+            self.status_bar.pack_forget()
+        self.status_label.configure(text=f"Working... ({pending} pending)" if pending > 1 else "Working...")
+
     def login(self):
-        # Check user credentials and show dashboard if correct
+        # Check user credentials off the Tk thread and show dashboard if correct
         email = self.email_entry.get()
         password = self.password_entry.get()
-        
-        for user in self.users:
-            if user.login(email, password):
-                self.current_user = user
-                messagebox.showinfo("Success", f"Welcome, {user.name}!")
-                self.show_dashboard()
+
+        def logged_in(result):
+            user, rehashed = result
+            if user is None:
+                messagebox.showerror("Error", "Invalid email or password")
                 return
-        
-        messagebox.showerror("Error", "Invalid email or password")
+            if rehashed:
+                self.save_data()  # Store the upgraded password hash
+            self.current_user = user
+            self.session_token = self.sessions.issue(user.userID)
+            messagebox.showinfo("Success", f"Welcome, {user.name}!")
+            self.show_dashboard()
+            self.check_offers()
+
+        self.background.watch(self.credentials.authenticate(self.users, email, password),
+                              on_done=logged_in, controls=(self.login_button,))
 
     def create_registration_frame(self):
         # Show registration window to register a new user or admin
@@ -451,25 +3212,39 @@ class GrandPrixApp:
                 
                 if any(user.email == email_entry.get() for user in self.users):
                     raise DuplicateUserError("Email already registered.")
-                
-                new_id = len(self.users) + 1
-                if admin_code_entry.get() == "ADMIN123":
-                    new_user = Admin(new_id, name_entry.get(), email_entry.get(), password_entry.get())
+            except (InvalidEmailError, DuplicateUserError) as e:
+                messagebox.showerror("Error", str(e))
+                return
+
+            # Hash the password in the background, then create the account
+            name, is_admin = name_entry.get(), admin_code_entry.get() == "ADMIN123"
+
+            def hashed(password_hash):
+                if any(user.email == email for user in self.users):
+                    messagebox.showerror("Error", "Email already registered.")
+                    return
+                new_id = max((user.userID for user in self.users), default=0) + 1
+                if is_admin:
+                    new_user = Admin(new_id, name, email, password_hash)
                 else:
-                    new_user = User(new_id, name_entry.get(), email_entry.get(), password_entry.get())
+                    new_user = User(new_id, name, email, password_hash)
+                new_user.purchase_history.attach(self.tickets, new_id)
                 
                 self.users.append(new_user)
                 print(f"✅ Registered user: {new_user.email}")
                 self.save_data()
                 messagebox.showinfo("Success", "Registration successful!")
-                reg_window.destroy()
-            except (InvalidEmailError, DuplicateUserError) as e:
-                messagebox.showerror("Error", str(e))
+                if reg_window.winfo_exists():
+                    reg_window.destroy()
+
+            self.background.watch(self.credentials.hash(password_entry.get()), on_done=hashed,
+                                  controls=(register_button,))
         
         # Registration button
         button_frame = ttk.Frame(content_frame)
         button_frame.grid(row=5, column=0, columnspan=2, pady=15)
-        ttk.Button(button_frame, text="Register", command=register_user, width=15).pack()
+        register_button = ttk.Button(button_frame, text="Register", command=register_user, width=15)
+        register_button.pack()
     
     # Clear the main app container to redraw screens like dashboard/login
     def clear_main_container(self):
@@ -564,10 +3339,9 @@ class GrandPrixApp:
         email_entry.insert(0, self.current_user.email)
         email_entry.grid(row=2, column=1, sticky="ew")
 
-        # Password entry field
-        ttk.Label(main_frame, text="Password:").grid(row=3, column=0, sticky="w", pady=5)
+        # Password entry field (left empty; only stored as a hash)
+        ttk.Label(main_frame, text="New Password:").grid(row=3, column=0, sticky="w", pady=5)
         password_entry = ttk.Entry(main_frame, show="*")
-        password_entry.insert(0, self.current_user.password)
         password_entry.grid(row=3, column=1, sticky="ew")
         
         # Function to save the updated profile
@@ -580,24 +3354,40 @@ class GrandPrixApp:
                 # Update current user data
                 self.current_user.name = name_entry.get()
                 self.current_user.email = email_entry.get()
-                self.current_user.password = password_entry.get()
-                
-                self.save_data()  # Save changes to file
-                messagebox.showinfo("Success", "Profile updated.")
-                profile_window.destroy()
             except InvalidEmailError as e:
                 messagebox.showerror("Error", str(e))
+                return
+
+            user = self.current_user
+
+            def saved(password_hash=None):
+                if password_hash is not None:
+                    user.password = password_hash
+                self.save_data()  # Save changes to file
+                messagebox.showinfo("Success", "Profile updated.")
+                if profile_window.winfo_exists():
+                    profile_window.destroy()
+
+            if password_entry.get():
+                self.background.watch(self.credentials.hash(password_entry.get()), on_done=saved,
+                                      controls=(save_button,))
+            else:
+                saved()
         
         # Save changes button
-        ttk.Button(main_frame, text="Save Changes", command=save_profile).grid(row=4, column=0, columnspan=2, pady=15)
+        save_button = ttk.Button(main_frame, text="Save Changes", command=save_profile)
+        save_button.grid(row=4, column=0, columnspan=2, pady=15)
         # Delete account button
         ttk.Button(main_frame, text="Delete My Account", command=lambda: self.delete_current_account(profile_window), style="TButton").grid(row=5, column=0, columnspan=2, pady=10)
         
     def delete_current_account(self, window):
         # Ask user for confirmation before deleting the account
         if messagebox.askyesno("Confirm", "Are you sure you want to delete your account? This action is irreversible."):
-            # Remove the user from the users list
+            # Remove the user from the users list and end all of their sessions
             self.users = [u for u in self.users if u.userID != self.current_user.userID]
+            self.sessions.revoke_user(self.current_user.userID)
+            self.waitlist.remove_user(self.current_user.userID)
+            self.session_token = None
            
             # Save updated user data
             self.save_data()
@@ -612,30 +3402,72 @@ class GrandPrixApp:
 
 
     def show_purchase_history(self):
-        # Create a new window to display the purchase history
+        # Create a new window to display the purchase history, one page at a time
         history_window = tk.Toplevel(self.root)
         history_window.title("Purchase History")
-    
-        # Set dynamic window size based on number of tickets
-        tickets = self.current_user.view_history()
-        height = 200 + len(tickets) * 120 if tickets else 300
-        width = 600
-        history_window.geometry(f"{width}x{height}")
+        history_window.geometry("600x800")
+
+        history = self.current_user.purchase_history
+        page_size = 5
+        past_events = object()  # filter value for tickets of finished, archived events
+        view = {"page": 0, "eventID": None, "archived": None}
 
         # Main frame to hold all the content
         main_frame = ttk.Frame(history_window, padding=20)
         main_frame.pack(fill="both", expand=True)
 
-        # Section title
-        ttk.Label(main_frame, text="Purchase History", style='Header.TLabel').pack(anchor="w", pady=(0, 10))
+        # Section title and event filter
+        header_frame = ttk.Frame(main_frame)
+        header_frame.pack(fill="x", pady=(0, 10))
+        ttk.Label(header_frame, text="Purchase History", style='Header.TLabel').pack(side="left")
+
+        filters = [("All events", None)] + [(event.name, event.eventID) for event in self.events]
+        if self.archive.entries():
+            filters.append(("Past events (archived)", past_events))
+        filter_combo = ttk.Combobox(header_frame, state="readonly", width=20,
+                                    values=[label for label, _ in filters])
+        filter_combo.current(0)
+        filter_combo.pack(side="right")
+
+        list_frame = ttk.Frame(main_frame)
+        list_frame.pack(fill="both", expand=True)
+
+        # Page navigation
+        nav_frame = ttk.Frame(main_frame)
+        nav_frame.pack(fill="x", pady=(10, 0))
+        prev_button = ttk.Button(nav_frame, text="< Previous", width=12)
+        prev_button.pack(side="left")
+        next_button = ttk.Button(nav_frame, text="Next >", width=12)
+        next_button.pack(side="right")
+        page_label = ttk.Label(nav_frame)
+        page_label.pack()
+
+        def render_page():
+            # Only the tickets on the current page get widgets
+            for widget in list_frame.winfo_children():
+                widget.destroy()
+
+            showing_past = view["eventID"] is past_events
+            if showing_past:
+                # Archived tickets are read into a plain list when the filter is picked
+                archived = view["archived"] or []
+                pages = max(1, -(-len(archived) // page_size))
+                view["page"] = min(view["page"], pages - 1)
+                tickets = archived[view["page"] * page_size:(view["page"] + 1) * page_size]
+            else:
+                pages = history.page_count(page_size, view["eventID"])
+                view["page"] = min(view["page"], pages - 1)
+                tickets = history.get_page(view["page"], page_size, view["eventID"])
+
+            # If user has no ticket history, show a message
+            if not tickets:
+                loading = showing_past and view["archived"] is None
+                ttk.Label(list_frame, text="Loading past events..." if loading else
+                          "No purchase history found.").pack(padx=20, pady=20)
 
-        # If user has no ticket history, show a message
-        if not tickets:
-            ttk.Label(main_frame, text="No purchase history found.").pack(padx=20, pady=20)
-        else:
             # Display each ticket in a labeled frame
             for ticket in tickets:
-                ticket_frame = ttk.LabelFrame(main_frame, text=f"Ticket #{ticket.ticketID}", padding=10)
+                ticket_frame = ttk.LabelFrame(list_frame, text=f"Ticket #{ticket.ticketID}", padding=10)
                 ticket_frame.pack(fill="x", pady=5)
 
                 # Ticket details
@@ -643,22 +3475,76 @@ class GrandPrixApp:
                 ttk.Label(ticket_frame, text=f"Price: ${ticket.calculate_price():.2f}").pack(anchor="w")
                 if ticket.seat:
                     ttk.Label(ticket_frame, text=f"Seat: {ticket.seat.seatID}").pack(anchor="w")
-                if ticket.event:
+                if ticket.event and ticket.event.venue:
                     ttk.Label(ticket_frame, text=f"Event: {ticket.event.get_event_info()}").pack(anchor="w")
+                elif ticket.event:
+                    ttk.Label(ticket_frame, text=f"Event: {ticket.event.name}").pack(anchor="w")
+                if showing_past:
+                    continue  # the event is over: no entry code and nothing to cancel
+                if ticket.event:
+                    ttk.Label(ticket_frame, text=f"Entry Code: {self.gate_signer.code_for(ticket)}",
+                              font=('Courier', 10)).pack(anchor="w")
 
                 # Add a button to cancel (delete) the ticket
-                def delete_ticket(t=ticket):
-                    if messagebox.askyesno("Confirm", "Are you sure you want to delete this ticket?"):
-                        t.seat.is_reserved = False
-                        self.current_user.purchase_history.tickets.remove(t)
-                        self.save_data()
-                        messagebox.showinfo("Deleted", "Ticket removed successfully.")
+                def delete_ticket(t=ticket, button=None):
+                    if not self.authorize(history_window):
                         history_window.destroy()
-                        self.show_purchase_history()
+                        return
+                    if messagebox.askyesno("Confirm", "Are you sure you want to delete this ticket?",
+                                           parent=history_window):
+                        with self.persistence.batch() as batch:
+                            if history.remove_ticket(t.ticketID) is None:
+                                return  # already cancelled (a second click or another window)
+                            self.release_seat(t.event, t.seat)  # Offered to the waitlist first
+                            if t.event and t.event.eventID in self.gates:
+                                self.gates[t.event.eventID].revoke(t.ticketID)
+                            self.tickets.save()
+                            self.save_data()
+
+                        def deleted(_result):
+                            if history_window.winfo_exists():
+                                messagebox.showinfo("Deleted", "Ticket removed successfully.",
+                                                    parent=history_window)
+                                render_page()
+
+                        # Wait for the write off the Tk thread, after this user's earlier writes
+                        self.background.submit(batch.commit.wait, key=self.current_user.userID,
+                                               on_done=deleted, controls=(button,))
+
+                cancel_button = ttk.Button(ticket_frame, text="Cancel Ticket")
+                cancel_button.configure(command=lambda t=ticket, b=cancel_button: delete_ticket(t, b))
+                cancel_button.pack(anchor="e", pady=5)
+
+            page_label.configure(text=f"Page {view['page'] + 1} of {pages}")
+            prev_button.configure(state="normal" if view["page"] > 0 else "disabled")
+            next_button.configure(state="normal" if view["page"] < pages - 1 else "disabled")
+
+        def change_page(step):
+            view["page"] += step
+            render_page()
+
+        def change_filter(_event=None):
+            view["eventID"] = filters[filter_combo.current()][1]
+            view["page"] = 0
+            if view["eventID"] is past_events and view["archived"] is None:
+                # Reading the archive decompresses segments, so do it in the background
+                def loaded(tickets):
+                    view["archived"] = tickets
+                    if history_window.winfo_exists():
+                        render_page()
 
-                ttk.Button(ticket_frame, text="Cancel Ticket", command=delete_ticket).pack(anchor="e", pady=5)
+                self.background.submit(history.archived, on_done=loaded)
+            render_page()
+
+        prev_button.configure(command=lambda: change_page(-1))
+        next_button.configure(command=lambda: change_page(1))
+        filter_combo.bind("<<ComboboxSelected>>", change_filter)
+        render_page()
 
     def select_event_before_booking(self, ticket_type):
+        if not self.authorize():
+            return
+
         # Create a popup window for event selection
         event_window = tk.Toplevel(self.root)
         event_window.title("Select Event")
@@ -691,6 +3577,9 @@ class GrandPrixApp:
             if not event:
                 messagebox.showerror("Error", "Event not found.")
                 return
+            if self.archive.is_archived(event.eventID):
+                messagebox.showerror("Error", "This event has finished; tickets are no longer on sale.")
+                return
             event_window.destroy()
             self.show_seat_selection(ticket_type, event)
         ttk.Button(frame, text="Continue", command=proceed).pack(pady=10)
@@ -753,29 +3642,55 @@ class GrandPrixApp:
         seat_frame = ttk.Frame(main_frame)
         seat_frame.pack()
 
-        # Generate seat buttons and apply styles depending on availability
-        for r in range(selected_event.venue.rows):
-            for s in range(selected_event.venue.seats_per_row):
-                seat = selected_event.venue.seats[r][s]
-                style = "Reserved.TButton" if seat.is_reserved else "Available.TButton"
-                state = "disabled" if seat.is_reserved else "normal"
+        # Generate seat buttons; their colours come from the event's seat feed below
+        seats = [seat for row in selected_event.venue.seats for seat in row]
+        buttons = []
+        for number, seat in enumerate(seats):
+            def toggle_seat(s=seat, n=number):
+                if s in selected_seats:
+                    selected_seats.remove(s)
+                    buttons[n].configure(style="Available.TButton")
+                else:
+                    selected_seats.append(s)
+                    buttons[n].configure(style="Selected.TButton")
+
+            btn = ttk.Button(seat_frame, text=seat.seatID, width=4, command=toggle_seat)
+            btn.grid(row=number // selected_event.venue.seats_per_row,
+                     column=number % selected_event.venue.seats_per_row, padx=2, pady=2)
+            buttons.append(btn)
 
-                btn = ttk.Button(seat_frame, text=seat.seatID, width=4, state=state, style=style)
-                btn.grid(row=r, column=s, padx=2, pady=2)
-                
-                # For available seats, add toggle selection logic
-                if not seat.is_reserved:
-                    seat.button = btn
-
-                    def toggle_seat(s=seat, b=btn):
-                        if s in selected_seats:
-                            selected_seats.remove(s)
-                            b.configure(style="Available.TButton")
-                        else:
-                            selected_seats.append(s)
-                            b.configure(style="Selected.TButton")
-
-                    btn.configure(command=toggle_seat)
+        taken_label = ttk.Label(main_frame, text="")
+        taken_label.pack()
+
+        # Keep the map live: only seats whose state changed since the last poll are redrawn
+        feed = self.seat_feeds.feed(selected_event)
+        shown = {"sequence": -1, "states": bytearray([255]) * len(seats)}
+
+        def paint(number, state):
+            if shown["states"][number] == state:
+                return
+            shown["states"][number] = state
+            if state == SeatFeed.FREE:
+                buttons[number].configure(state="normal", style="Available.TButton")
+                return
+            if seats[number] in selected_seats:
+                selected_seats.remove(seats[number])
+                taken_label.configure(text=f"Seat {seats[number].seatID} was just taken by someone else.")
+            buttons[number].configure(state="disabled", style="Reserved.TButton")
+
+        def refresh_seats():
+            if not seat_window.winfo_exists():
+                return
+            sequence, states, changes = feed.changes_since(shown["sequence"])
+            shown["sequence"] = sequence
+            if states is not None:
+                for number, state in enumerate(states):
+                    paint(number, state)
+            for number, state in changes:
+                paint(number, state)
+            seat_window.after(self.SEAT_FEED_POLL_MS, refresh_seats)
+
+        refresh_seats()
         
         # Legend for button colors
         legend_frame = ttk.Frame(main_frame)
@@ -800,28 +3715,40 @@ class GrandPrixApp:
             seat_window.destroy()
 
         ttk.Button(main_frame, text="Continue to Payment", command=proceed_to_payment, style="Large.TButton").pack(pady=10)
+
+        # Queue for a seat that someone gives back (mainly for sold-out events)
+        def join_waitlist():
+            history = self.current_user.purchase_history
+            try:
+                self.waitlist.join(selected_event.eventID, self.current_user.userID, ticket_type,
+                                   Waitlist.priority_for(ticket_type, history))
+            except WaitlistError as e:
+                messagebox.showerror("Waitlist", str(e), parent=seat_window)
+                return
+            place = self.waitlist.position(selected_event.eventID, self.current_user.userID)
+            messagebox.showinfo("Waitlist", f"You are number {place} on the waitlist for "
+                                f"{selected_event.name}. We will hold a seat for you if one "
+                                f"becomes free.", parent=seat_window)
+
+        ttk.Button(main_frame, text=f"Join Waitlist ({self.waitlist.waiting(selected_event.eventID)} waiting)",
+                   command=join_waitlist).pack()
     
     def get_next_ticket_id(self):
         """
-        Generate the next unique ticket ID by checking the highest existing ticket ID in the saved file.
-        Returns 1 if the file is missing or empty.
+        Allocate the next unique ticket ID from the ticket store.
+        Every seat in a purchase gets its own ID.
         """
-        try:
-            with open('tickets.pkl', 'rb') as f:
-                tickets = pickle.load(f)
-                if tickets:  # If there are tickets, get the highest ID
-                    return max(t.ticketID for t in tickets) + 1
-                return 1
-        except (FileNotFoundError, EOFError):
-            return 1
+        return self.tickets.next_ticket_id()
         
-    def finalize_purchase(self, seats, ticket_type, is_group=False, event=None):
+    def finalize_purchase(self, seats, ticket_type, is_group=False, event=None, offer=None):
         """
         Finalizes the ticket purchase after seat selection. Applies pricing rules, 
         shows the payment interface, and saves the ticket on successful payment.
+        With a waitlist offer, its held seat is taken over by this checkout.
         """
-        selected_seats = []  # To track all selected seats
-        total_price = 0      # To track the total price for all tickets
+        if offer is not None and not self.waitlist.claim(offer):
+            messagebox.showerror("Offer Expired", "Sorry, this seat offer has expired.")
+            return
 
         # If group purchase is selected, ask for group size
         if is_group:
@@ -833,42 +3760,26 @@ class GrandPrixApp:
         else:
             quantity = len(seats)  # Each seat counts as one
 
-        # Iterate through selected seats and reserve them
-        for seat in seats:
-            
-            if len(event.venue.get_available_seats()) < len(seats):
-                messagebox.showerror("Full", "Not enough seats available for your group.")
-                return
+        if offer is None and len(event.venue.get_available_seats()) < len(seats):
+            messagebox.showerror("Full", "Not enough seats available for your group.")
+            return
 
-            if seat.reserve():
-                ticket_id = self.get_next_ticket_id()
-            
-                # Calculate price for this seat
-                ticket = GroupDiscount(ticket_id, 100) if is_group else ticket_type(ticket_id, 100)
-            
-                # For group discount, the price is calculated once for each seat
-                if is_group:
-                    price = ticket.calculate_price(quantity) 
-                else:
-                    price = ticket.calculate_price()
-                
-                total_price += price  # Add to the total price
-            
-                ticket.seat = seat
-                ticket.event = event
-                selected_seats.append(ticket)  # Track this ticket for later payment
-            else:
-                # If any seat is unavailable, cancel the entire reservation
-                messagebox.showwarning("Seat Not Available", f"Seat {seat.seatID} is already reserved.")
-                for s in selected_seats:
-                    s.seat.is_reserved = False
-                return  # Exit if a seat is unavailable
+        # Reserve every selected seat and price its ticket; if another buyer got
+        # one of the seats first, nothing is reserved
+        try:
+            selected_seats, total_price = hold_tickets(
+                seats, event, ticket_type, self.get_next_ticket_id,
+                quantity=quantity if is_group else None, held=(offer.seat,) if offer else ())
+        except SeatUnavailableError as e:
+            messagebox.showwarning("Seat Not Available", str(e))
+            return
+        self.seat_feeds.publish(event, [ticket.seat for ticket in selected_seats], SeatFeed.HELD)
         
         # Open payment interface
         payment_window = tk.Toplevel(self.root)
         payment_window.title("Payment Details")
-        payment_window.geometry("500x300")
-        payment_window.minsize(400, 250)
+        payment_window.geometry("500x360")
+        payment_window.minsize(400, 300)
 
         main_frame = ttk.Frame(payment_window, padding=20)
         main_frame.pack(fill="both", expand=True)
@@ -917,84 +3828,144 @@ class GrandPrixApp:
         update_payment_fields()
 
 
+        # One idempotency key per checkout, so retrying after a failed (maybe charged)
+        # attempt cannot bill the card twice; only a decline starts a new charge
+        checkout = {"charging": False, "completed": False, "discount": None, "total": total_price,
+                    "key": uuid.uuid4().hex}
+        user = self.current_user  # the buyer, even if someone logs out or in while a charge runs
+        user_id = user.userID
+
+        # Promo code entry
+        ttk.Label(main_frame, text="Promo Code:").grid(row=4, column=0, sticky="w", pady=5)
+        promo_frame = ttk.Frame(main_frame)
+        promo_frame.grid(row=4, column=1, sticky="ew", padx=5)
+        promo_entry = ttk.Entry(promo_frame)
+        promo_entry.pack(side="left", fill="x", expand=True)
+
         # Display total price
         price_frame = ttk.Frame(main_frame)
-        price_frame.grid(row=4, column=0, columnspan=2, pady=10, sticky="ew")
+        price_frame.grid(row=5, column=0, columnspan=2, pady=10, sticky="ew")
+
+        price_label = ttk.Label(price_frame, text=f"Total Price: ${total_price:.2f}",  # Use total_price here
+            font=('Helvetica', 12, 'bold'))
+        price_label.pack(side="right")
+        discount_label = ttk.Label(price_frame, text="")
+        discount_label.pack(side="left")
+
+        def apply_promo_code():
+            # Hold one use of the code for this checkout; swap out any earlier code
+            code = promo_entry.get()
+            previous = checkout["discount"]
+            if previous is not None and previous.code == code.strip().upper():
+                return
+            try:
+                discount = self.discounts.reserve(code, user_id)
+            except InvalidDiscountError as e:
+                messagebox.showerror("Promo Code", str(e), parent=payment_window)
+                return
+            if previous is not None:
+                self.discounts.release(previous, user_id)
+            checkout["discount"] = discount
+            checkout["total"] = discount.apply_discount(total_price)
+            discount_label.configure(text=f"{discount.code}: {discount.description} (-{discount.percentage:g}%)")
+            price_label.configure(text=f"Total Price: ${checkout['total']:.2f}")
 
-        ttk.Label(price_frame, text=f"Total Price: ${total_price:.2f}",  # Use total_price here
-            font=('Helvetica', 12, 'bold')).pack(side="right")
+        apply_button = ttk.Button(promo_frame, text="Apply", command=apply_promo_code)
+        apply_button.pack(side="left", padx=(5, 0))
 
         button_frame = ttk.Frame(main_frame)
-        button_frame.grid(row=5, column=0, columnspan=2, pady=10)
+        button_frame.grid(row=6, column=0, columnspan=2, pady=10)
+
+        status_label = ttk.Label(button_frame, text="")
+
+        def release_seats():
+            # Give the held seats and promo code back if the window closes without a purchase
+            if checkout["charging"]:
+                messagebox.showwarning("Payment Pending", "Please wait for the payment to finish.",
+                                       parent=payment_window)
+                return
+            if not checkout["completed"]:
+                for ticket in selected_seats:
+                    self.release_seat(event, ticket.seat)
+                if checkout["discount"] is not None:
+                    self.discounts.release(checkout["discount"], user_id)
+            payment_window.destroy()
+
+        payment_window.protocol("WM_DELETE_WINDOW", release_seats)
 
         def process_payment():
+            if not self.authorize(payment_window):
+                release_seats()
+                return
+
             payment = Payment(
-                len(self.current_user.purchase_history.tickets) + 1,
-                total_price,
+                len(user.purchase_history.tickets) + 1,
+                checkout["total"],
                 method_var.get(),
                 card_entry.get(),
                 expiry_entry.get()
             )
 
-            if not payment.process_payment():
-                messagebox.showerror("Error", "Payment failed. Please check your details.")
-                # Unreserve the seats
-                for ticket in selected_seats:
-                    ticket.seat.is_reserved = False
+            # Charge on the payment worker pool; the seats stay held meanwhile
+            charged = Future()
+            checkout["charging"] = True
+            self.payments.submit(payment, checkout["key"], callback=lambda job: charged.set_result(job.result))
+            status_label.configure(text="Processing payment...")
+            self.background.watch(charged, on_done=check_payment, controls=(pay_button, apply_button))
+
+        def check_payment(result):
+            checkout["charging"] = False
+            status_label.configure(text="")
+            if not result.approved:
+                # Keep the seats held so the details can be corrected and retried
+                if result.status == PaymentResult.DECLINED:
+                    checkout["key"] = uuid.uuid4().hex
+                messagebox.showerror("Error", f"Payment failed. {result.message}",
+                                     parent=payment_window)
                 return
 
-            # If payment is successful, add all tickets to purchase history
-            for ticket in selected_seats:
-                if hasattr(ticket.seat, "button"):
-                    del ticket.seat.button  # Remove GUI reference before pickling
-                self.current_user.purchase_history.add_ticket(ticket)
-                try:
+            checkout["completed"] = True
+            # If payment is successful, add all tickets to purchase history and
+            # save them together with the users in a single durable commit
+            with self.persistence.batch() as batch:
+                for ticket in selected_seats:
+                    user.purchase_history.add_ticket(ticket)
                     self.save_ticket(ticket)
-                except Exception as e:
-                    messagebox.showerror("Error", f"Failed to save ticket: {e}")
-                    return
+                    if ticket.event.eventID in self.gates:
+                        self.gates[ticket.event.eventID].add(ticket)
+                self.seat_feeds.publish(event, [ticket.seat for ticket in selected_seats], SeatFeed.SOLD)
+                if checkout["discount"] is not None:
+                    self.discounts.confirm(checkout["discount"], user_id)
+                self.save_data()
 
-            self.save_data()
-            messagebox.showinfo("Success", "Tickets purchased successfully!")
-            payment_window.destroy()
+            def saved(_result):
+                messagebox.showinfo("Success", "Tickets purchased successfully!")
+                if payment_window.winfo_exists():
+                    payment_window.destroy()
 
-        ttk.Button(button_frame, text="Complete Purchase", command=process_payment, 
-                    style="Large.TButton", width=20).pack()
+            def save_failed(error):
+                if status_label.winfo_exists():
+                    status_label.configure(text="")
+                messagebox.showerror("Error", f"Failed to save ticket: {error}")
 
+            # Wait for the durable write off the Tk thread, after this user's earlier writes
+            status_label.configure(text="Saving tickets...")
+            self.background.submit(batch.commit.wait, key=user_id, on_done=saved, on_error=save_failed,
+                                   controls=(pay_button, apply_button))
 
+        pay_button = ttk.Button(button_frame, text="Complete Purchase", command=process_payment,
+                    style="Large.TButton", width=20)
+        pay_button.pack()
+        status_label.pack(pady=(5, 0))
 
     def save_ticket(self, ticket):
         """
-        Save a single ticket to the tickets.pkl file after removing any GUI references.
-        Ensures ticket data is serializable using pickle.
+        Add a ticket to the ticket store and queue the ticket file for writing.
+        Inside a batch, the tickets of one booking are written once when the
+        batch commits.
         """
-        import traceback
-
-        # Try to load existing tickets or create empty list
-        try:
-            with open('tickets.pkl', 'rb') as f:
-                all_tickets = pickle.load(f)
-        except (FileNotFoundError, EOFError):
-            all_tickets = []
-
-        # Remove GUI reference before saving
-        if ticket.seat and hasattr(ticket.seat, "button"):
-            print("🔍 Removing seat.button from ticket before saving")
-            del ticket.seat.button
-
-        all_tickets.append(ticket)
-        self.strip_gui_from_venue() # Also remove any remaining GUI refs from venue
-
-        try:
-            print("💾 Attempting to save ticket...")
-            with open('tickets.pkl', 'wb') as f:
-                pickle.dump(all_tickets, f)
-            print("✅ Ticket saved successfully.")
-        except Exception as e:
-            print("❌ Exception during ticket saving:")
-            traceback.print_exc()  # Prints full error in console
-            messagebox.showerror("Error", f"Failed to save ticket: {e}")
-            raise
+        self.tickets.add(ticket)
+        return self.tickets.save()
 
     def show_admin_dashboard(self, parent_frame):
         """
@@ -1011,53 +3982,179 @@ class GrandPrixApp:
         admin_content.columnconfigure(1, weight=1)
         
         # Sales data section (total tickets sold)
-        sales = self.current_user.view_sales_data()
         sales_frame = ttk.Frame(admin_content)
         sales_frame.grid(row=0, column=0, sticky="nsew", padx=5, pady=5)
         
         ttk.Label(sales_frame, text="Sales Data", font=('Helvetica', 12, 'bold')).pack(anchor="w")
-        ttk.Label(sales_frame, text=f"Total Tickets Sold: {sales}").pack(anchor="w", pady=5)
+        sales_label = ttk.Label(sales_frame, text="Total Tickets Sold: ...")
+        sales_label.pack(anchor="w", pady=5)
+
+        # Counting reads the ticket file, so do it in the background on a snapshot
+        def show_sales(sales):
+            if sales_label.winfo_exists():
+                sales_label.configure(text=f"Total Tickets Sold: {sales}")
+
+        self.background.submit(self.read_snapshot, lambda snapshot: self.current_user.view_sales_data(
+            snapshot, self.archive), on_done=show_sales)
         
         # Admin control buttons: Manage Discounts and View Venue Seats
         controls_frame = ttk.Frame(admin_content)
         controls_frame.grid(row=0, column=1, sticky="nsew", padx=5, pady=5)
         
         ttk.Button(controls_frame, text="Manage Discounts", 
-                 command=self.current_user.manage_discounts, width=20).pack(fill="x", pady=5)
+                 command=lambda: self.current_user.manage_discounts(self.discounts), width=20).pack(fill="x", pady=5)
+        ttk.Button(controls_frame, text="Gate Scanner", command=self.show_gate_scanner,
+                   width=20).pack(fill="x", pady=5)
         
-        ttk.Button(
-                controls_frame,
-                text="View Venue Status",
-                command=lambda: messagebox.showinfo(
-                    "Venue Status",
-                    "\n".join([
-                        f"{event.name} ({event.date.strftime('%Y-%m-%d')}): {len(event.venue.get_available_seats())} seats available"
-                        for event in self.events
-                ])
-            ),
-            width=20
-        ).pack(fill="x", pady=5)
+        # Venue status comes from the same kind of snapshot, as of the last save
+        def show_venue_status(report):
+            total, sold = report
+            messagebox.showinfo("Venue Status", "\n".join(
+                [f"{event.name} ({event.date.strftime('%Y-%m-%d')}): {sold.get(event.eventID, 0)} seats sold, "
+                 + ("finished (archived)" if self.archive.is_archived(event.eventID) else
+                    f"{event.venue.rows * event.venue.seats_per_row - sold.get(event.eventID, 0)} seats available")
+                 for event in self.events] + [f"Total tickets sold: {total}"]))
+
+        venue_button = ttk.Button(controls_frame, text="View Venue Status", width=20)
+        venue_button.configure(command=lambda: self.background.submit(
+            self.read_snapshot, lambda snapshot: sales_report(snapshot, self.archive),
+            on_done=show_venue_status, controls=(venue_button,)))
+        venue_button.pack(fill="x", pady=5)
+
+        # Online backup: a consistent copy of every data file while sales go on
+        def back_up():
+            destination = filedialog.askdirectory(title="Back up data to")
+            if not destination:
+                return
+            self.background.submit(
+                self.read_snapshot, lambda snapshot: snapshot.backup(destination), True,
+                on_done=lambda files: messagebox.showinfo("Backup", f"Backed up {len(files)} files to {destination}."),
+                controls=(backup_button,))
+
+        backup_button = ttk.Button(controls_frame, text="Back Up Data", command=back_up, width=20)
+        backup_button.pack(fill="x", pady=5)
+
+
+    def read_snapshot(self, report, flush=False):
+        """
+        Run report(snapshot) on a point-in-time snapshot of the data files and
+        return its result. Reads files, so call it through self.background.
+        """
+        with self.persistence.snapshot(flush=flush) as snapshot:
+            return report(snapshot)
+
+    def release_seat(self, event, seat):
+        """Give a seat back: it is held for the next person on the waitlist, or freed."""
+        return self.waitlist.seat_released(event, seat)
+
+    def tick_waitlist(self):
+        # Runs every few seconds on the Tk thread
+        self.waitlist.expire()
+        self.check_offers()
+        self.root.after(self.WAITLIST_TICK_MS, self.tick_waitlist)
+
+    def check_offers(self):
+        """Offer the logged-in user any seats held for them from a waitlist."""
+        if self.current_user is None:
+            return
+        for offer in self.waitlist.offers_for(self.current_user.userID):
+            if offer in self._offers_shown:
+                continue
+            self._offers_shown.add(offer)
+            until = datetime.fromtimestamp(offer.expires_at).strftime('%H:%M')
+            if messagebox.askyesno("Seat Available",
+                                   f"Seat {offer.seat.seatID} at {offer.event.name} is being held for "
+                                   f"you until {until}. Book it now?"):
+                self.finalize_purchase([offer.seat], offer.entry.ticket_type, event=offer.event, offer=offer)
+            else:
+                self.waitlist.decline(offer)
+        self._offers_shown.intersection_update(self.waitlist.offers_for(self.current_user.userID))
 
+    def gate(self, eventID):
+        """Return the gate index for an event, building it from the ticket store on first use."""
+        index = self.gates.get(eventID)
+        if index is None:
+            index = self.gates[eventID] = GateIndex.from_store(
+                self.tickets, eventID, self.gate_signer, log_path=f"gate-{eventID}.log")
+        return index
+
+    def show_gate_scanner(self):
+        # Window for checking entry codes at a gate, one event at a time
+        scan_window = tk.Toplevel(self.root)
+        scan_window.title("Gate Scanner")
+        scan_window.geometry("460x260")
+
+        frame = ttk.Frame(scan_window, padding=20)
+        frame.pack(fill="both", expand=True)
+        frame.columnconfigure(1, weight=1)
+
+        ttk.Label(frame, text="Event:").grid(row=0, column=0, sticky="w", pady=5)
+        event_combo = ttk.Combobox(frame, state="readonly", values=[event.name for event in self.events])
+        event_combo.grid(row=0, column=1, sticky="ew", padx=5)
+        event_combo.current(0)
+
+        ttk.Label(frame, text="Entry Code:").grid(row=1, column=0, sticky="w", pady=5)
+        code_entry = ttk.Entry(frame, font=('Courier', 10))
+        code_entry.grid(row=1, column=1, sticky="ew", padx=5)
+        code_entry.focus_set()
+
+        result_label = ttk.Label(frame, text="", font=('Helvetica', 12, 'bold'))
+        result_label.grid(row=3, column=0, columnspan=2, pady=10)
+        count_label = ttk.Label(frame, text="")
+        count_label.grid(row=4, column=0, columnspan=2)
+
+        def scan(_event=None):
+            index = self.gate(self.events[event_combo.current()].eventID)
+            result = index.scan(code_entry.get())
+            text = result.status.capitalize()
+            if result.seatID:
+                text += f" – seat {result.seatID}"
+            if result.scanned_at is not None:
+                first = TIMESTAMP_EPOCH + timedelta(microseconds=result.scanned_at)
+                text += f" (first entry {first.strftime('%H:%M:%S')} UTC)"
+            result_label.configure(text=text, foreground="green" if result.admitted else "red")
+            count_label.configure(text=f"{len(index.used)} of {len(index.valid)} tickets used")
+            code_entry.delete(0, tk.END)
+
+        code_entry.bind("<Return>", scan)
+        ttk.Button(frame, text="Scan", command=scan).grid(row=2, column=0, columnspan=2, pady=5)
+
+    def authorize(self, parent=None):
+        """
+        Return True if the current session is still valid. Otherwise tell the
+        user it expired and go back to the login screen.
+        """
+        if (self.current_user is not None
+                and self.sessions.resolve(self.session_token) == self.current_user.userID):
+            return True
+        messagebox.showwarning("Session Expired", "Your session has expired. Please log in again.",
+                               parent=parent)
+        self.logout()
+        return False
 
     def logout(self):
-        """Log out the current user and return to the login screen."""
+        """Log out the current user, end the session and return to the login screen."""
+        self.sessions.revoke(self.session_token)
+        self.session_token = None
         self.current_user = None
         self.create_login_frame()
 
 if __name__ == "__main__":
-    # Ensure required data files exist or create them if missing
-    if not os.path.exists('users.pkl'):
-        with open('users.pkl', 'wb') as f:
-            pickle.dump([], f)
-    
-    if not os.path.exists('tickets.pkl'):
-        with open('tickets.pkl', 'wb') as f:
-            pickle.dump([], f)
-    
-    if not os.path.exists('discounts.pkl'):
-        with open('discounts.pkl', 'wb') as f:
-            pickle.dump([], f)
+    # Convert old .pkl data on first run, then make sure every data file exists
+    if not os.path.exists(USERS_FILE) and os.path.exists('users.pkl'):
+        print("🔁 Converted %d users, %d tickets and %d discounts from .pkl files." % convert_legacy_files())
+
+    for path, codec in ((USERS_FILE, UserCodec()), (TICKETS_FILE, TicketCodec()),
+                        (DISCOUNTS_FILE, DiscountCodec()), (WAITLIST_FILE, WaitlistCodec())):
+        if not os.path.exists(path):
+            atomic_write(path, encode_records(codec, []))
 
     # Launch the application
     app = GrandPrixApp()
     app.root.mainloop()
+    app.payments.shutdown(wait=False)
+    app.background.shutdown(wait=False)
+    app.credentials.shutdown(wait=False)
+    for gate in app.gates.values():
+        gate.close()
+    app.persistence.close()  # Write out anything still queued